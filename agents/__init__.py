@@ -0,0 +1,18 @@
+from .engine import Agent, Engine, Session, Step
+from .executor import ToolExecutor
+from .history import History
+from .shell import CommandResult, ShellPool, ShellSession
+from .tool_schema import tool_schema
+
+__all__ = [
+    "Agent",
+    "Engine",
+    "Session",
+    "Step",
+    "History",
+    "ToolExecutor",
+    "ShellSession",
+    "ShellPool",
+    "CommandResult",
+    "tool_schema",
+]
@@ -0,0 +1,428 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+import uuid
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from llm import get_async_client
+from .executor import ToolExecutor
+from .history import History
+from .stream_parser import JsonObjectStream
+from .tool_schema import tool_schema
+
+# LLM requests in flight across all sessions of an engine
+MAX_LLM_CALLS = int(os.getenv("AGENT_MAX_LLM_CALLS", "32"))
+# Sessions idle for longer are closed when the next one is created
+SESSION_TTL = float(os.getenv("AGENT_SESSION_TTL", "1800"))
+# Threads for the blocking tools of all sessions of an engine
+ENGINE_TOOL_WORKERS = int(os.getenv("AGENT_ENGINE_TOOL_WORKERS", "64"))
+
+# Agents answer with one step per reply unless AGENT_BATCHED_STEPS=1
+BATCHED_STEPS = os.getenv("AGENT_BATCHED_STEPS", "0") == "1"
+# Agents call tools through the provider's tools API if AGENT_NATIVE_TOOLS=1
+NATIVE_TOOLS = os.getenv("AGENT_NATIVE_TOOLS", "0") == "1"
+
+VALID_STEPS = {"START", "PLAN", "OUTPUT", "TOOL", "OBSERVE"}
+
+BATCH_PROMPT = """
+
+Batched mode, this replaces the rule of one step per response:
+– Respond with every step you can take before you need the output of a tool, in order
+– End the response with the TOOL step whose OBSERVE you need, or with the OUTPUT step
+– Several TOOL steps in a row are run at the same time, only do that when they do not depend on each other
+– You get the OBSERVE steps of all of them in the next message
+"""
+NATIVE_PROMPT = """
+You're an expert AI Assistant in resolving user queries.
+Think through what needs to be done, call the available tools when you need their output
+and answer the user in plain text once you have everything you need.
+Call several tools in the same response when they do not depend on each other.
+"""
+BATCH_FORMAT = {
+    True: 'Output Format: { "steps": [ step, step, ... ] }, each step in the JSON format above.',
+    False: "Output the steps as JSON objects one after another, each in the JSON format above.",
+}
+
+
+class Step(BaseModel):
+    step: str = Field(
+        ..., description="The id of the step like START, PLAN, OUTPUT, TOOL, OBSERVE"
+    )
+    content: Optional[str] = Field(None, description="The optional string content")
+    tool: Optional[str] = Field(None, description="The id of the tool call")
+    input: Optional[str] = Field(None, description="The input parms for the tool")
+    output: Optional[str] = Field(None, description="The output of the tool call")
+
+
+class StepBatch(BaseModel):
+    steps: list[Step] = Field(
+        ..., description="The steps up to and including the next TOOL or OUTPUT step"
+    )
+
+
+def format_step(step: Step) -> str:
+    if step.step == "TOOL":
+        return f"🛠️: {step.tool} {step.input}"
+    if step.step == "OBSERVE":
+        return str(step.output)
+    icon = {"START": "🔥", "PLAN": "🧠", "OUTPUT": "🤖"}.get(step.step, "⚠️")
+    return f"{icon} {step.content}"
+
+
+class Agent:
+    """What a session runs: the prompt, the model and the tools.
+
+    `tools` is called once per session, so state such as a shell belongs to
+    one session. It can register cleanups with `Session.on_close`.
+    `structured` asks the provider for a Step with response_format, otherwise
+    the JSON steps are taken out of the reply text. `batched` lets the model
+    answer with all steps up to the next tool call at once, which saves a
+    round trip per step. `native_tools` drops the JSON steps for the
+    provider's tools API, with `native_prompt` as the system prompt and the
+    schemas built from the tool signatures.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        model: str,
+        provider: str = "openrouter",
+        tools: Callable[["Session"], dict[str, Callable]] | None = None,
+        structured: bool = True,
+        batched: bool = BATCHED_STEPS,
+        native_tools: bool = NATIVE_TOOLS,
+        native_prompt: str = NATIVE_PROMPT,
+        valid_steps: set[str] = VALID_STEPS,
+        max_steps: int = 30,
+        retry_limit: int = 5,
+    ):
+        self.system_prompt = system_prompt
+        self.model = model
+        self.provider = provider
+        self.tools = tools
+        self.structured = structured
+        self.batched = batched
+        self.native_tools = native_tools
+        self.native_prompt = native_prompt
+        self.valid_steps = valid_steps
+        self.max_steps = max_steps
+        self.retry_limit = retry_limit
+
+    def prompt(self) -> str:
+        if self.native_tools:
+            return self.native_prompt
+        if not self.batched:
+            return self.system_prompt
+        return self.system_prompt + BATCH_PROMPT + BATCH_FORMAT[self.structured]
+
+
+def _keyword_tool(function: Callable) -> Callable[[dict], object]:
+    if inspect.iscoroutinefunction(function):
+
+        async def call(arguments: dict):
+            return await function(**arguments)
+
+    else:
+
+        def call(arguments: dict):
+            return function(**arguments)
+
+    return call
+
+
+class Session:
+    """One conversation with an agent, its turns run one at a time."""
+
+    def __init__(self, engine: "Engine", agent: Agent):
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.agent = agent
+        self.history = History(agent.prompt())
+        self.last_used = time.monotonic()
+        self._cleanups: list[Callable[[], None]] = []
+        self._turn = asyncio.Lock()
+        tools = agent.tools(self) if agent.tools else {}
+        self.tool_schemas: list[dict] = []
+        if agent.native_tools:
+            self.tool_schemas = [
+                tool_schema(name, function) for name, function in tools.items()
+            ]
+            # Native calls name their arguments, JSON steps pass one input
+            tools = {name: _keyword_tool(function) for name, function in tools.items()}
+        self.executor = ToolExecutor(tools, pool=engine.tool_pool)
+
+    def on_close(self, cleanup: Callable[[], None]):
+        self._cleanups.append(cleanup)
+
+    def close(self):
+        self.executor.close()
+        for cleanup in self._cleanups:
+            cleanup()
+
+    async def run(self, user_query: str) -> AsyncIterator[Step]:
+        """Steps of the agent's answer to `user_query`, ending with OUTPUT or ERROR."""
+        async with self._turn:
+            self.last_used = time.monotonic()
+            self.history.append({"role": "user", "content": user_query})
+            run = self._run_native if self.agent.native_tools else self._run
+            async for step in run():
+                yield step
+            self.last_used = time.monotonic()
+
+    async def _run(self) -> AsyncIterator[Step]:
+        retry_count = 0
+        for _ in range(self.agent.max_steps):
+            got_steps = False
+            calls: list[tuple[str, str]] = []
+            tasks: list[asyncio.Task] = []
+
+            async with aclosing(self.engine.steps(self.agent, self.history)) as steps:
+                async for step in steps:
+                    got_steps = True
+                    if step.step not in self.agent.valid_steps:
+                        continue
+                    # Steps after a tool call were made up without its output
+                    if calls and step.step != "TOOL":
+                        break
+                    self.history.append(
+                        {"role": "assistant", "content": json.dumps(step.model_dump())}
+                    )
+                    yield step
+
+                    if step.step == "TOOL" and step.tool and step.input is not None:
+                        # Tool calls start as soon as their step arrives and run
+                        # side by side with the rest of the reply and each other
+                        calls.append((step.tool, step.input))
+                        tasks.append(
+                            asyncio.create_task(self.executor.arun(calls[-1:]))
+                        )
+                    elif step.step == "OUTPUT":
+                        return
+
+            if not got_steps:
+                retry_count += 1
+                if retry_count >= self.agent.retry_limit:
+                    yield Step(step="ERROR", content="Too many failures. Stopping.")
+                    return
+                self.history.append(
+                    {
+                        "role": "system",
+                        "content": "You FAILED. Output valid JSON steps only."
+                        if self.agent.batched
+                        else "You FAILED. Output ONE valid JSON step only.",
+                    }
+                )
+                continue
+            retry_count = 0
+
+            for (tool, tool_input), task in zip(calls, tasks):
+                (output,) = await task
+                observation = Step(
+                    step="OBSERVE", tool=tool, input=tool_input, output=output
+                )
+                self.history.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": tool,
+                        "content": json.dumps(
+                            observation.model_dump(exclude={"content"})
+                        ),
+                    }
+                )
+                yield observation
+
+        yield Step(step="ERROR", content="Max steps reached — stopping.")
+
+    async def _run_native(self) -> AsyncIterator[Step]:
+        for _ in range(self.agent.max_steps):
+            message = await self.engine.tool_turn(
+                self.agent, self.history, self.tool_schemas
+            )
+            if not message.tool_calls:
+                self.history.append(
+                    {"role": "assistant", "content": message.content or ""}
+                )
+                yield Step(step="OUTPUT", content=message.content)
+                return
+
+            self.history.append(
+                {
+                    "role": "assistant",
+                    "content": message.content,
+                    "tool_calls": [
+                        {
+                            "id": call.id,
+                            "type": "function",
+                            "function": {
+                                "name": call.function.name,
+                                "arguments": call.function.arguments,
+                            },
+                        }
+                        for call in message.tool_calls
+                    ],
+                }
+            )
+            if message.content:
+                yield Step(step="PLAN", content=message.content)
+
+            for call in message.tool_calls:
+                yield Step(
+                    step="TOOL", tool=call.function.name, input=call.function.arguments
+                )
+            # The calls of one turn run side by side
+            outputs = await asyncio.gather(
+                *(self._call_tool(call) for call in message.tool_calls)
+            )
+            for call, output in zip(message.tool_calls, outputs):
+                self.history.append(
+                    {"role": "tool", "tool_call_id": call.id, "content": output}
+                )
+                yield Step(
+                    step="OBSERVE",
+                    tool=call.function.name,
+                    input=call.function.arguments,
+                    output=output,
+                )
+
+        yield Step(step="ERROR", content="Max steps reached — stopping.")
+
+    async def _call_tool(self, call) -> str:
+        try:
+            arguments = json.loads(call.function.arguments or "{}")
+        except ValueError:
+            arguments = None
+        if not isinstance(arguments, dict):
+            return f"Error: the arguments of {call.function.name} are not a JSON object"
+        (output,) = await self.executor.arun([(call.function.name, arguments)])
+        return output
+
+
+class Engine:
+    """Runs many agent sessions on one event loop.
+
+    LLM requests of all sessions share `max_llm_calls` slots and blocking
+    tools share a pool of `tool_workers` threads, so slow calls of one
+    session overlap with the others instead of holding them up.
+    """
+
+    def __init__(
+        self,
+        max_llm_calls: int = MAX_LLM_CALLS,
+        tool_workers: int = ENGINE_TOOL_WORKERS,
+        session_ttl: float = SESSION_TTL,
+    ):
+        self.sessions: dict[str, Session] = {}
+        self.session_ttl = session_ttl
+        self.tool_pool = ThreadPoolExecutor(
+            max_workers=tool_workers, thread_name_prefix="agent-tool"
+        )
+        self._llm_calls = asyncio.Semaphore(max_llm_calls)
+
+    def create_session(self, agent: Agent) -> Session:
+        self._close_idle()
+        session = Session(self, agent)
+        self.sessions[session.id] = session
+        return session
+
+    def close_session(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def _close_idle(self):
+        expired = time.monotonic() - self.session_ttl
+        for session in list(self.sessions.values()):
+            if session.last_used < expired and not session._turn.locked():
+                self.close_session(session.id)
+
+    def close(self):
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        self.tool_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def tool_turn(self, agent: Agent, history: History, tools: list[dict]):
+        """The next reply of the model, with its calls of `tools` if it made any."""
+        client = get_async_client(agent.provider)
+        async with self._llm_calls:
+            response = await client.chat.completions.create(
+                model=agent.model,
+                messages=history.messages(),
+                **({"tools": tools} if tools else {}),
+            )
+        return response.choices[0].message
+
+    async def steps(self, agent: Agent, history: History) -> AsyncIterator[Step]:
+        """The next steps of the model, as soon as each one is complete.
+
+        Nothing is yielded when the reply holds no step that parses.
+        """
+        queue: asyncio.Queue[Step | None] = asyncio.Queue()
+        # The reply is read to its end by its own task, a slow consumer does
+        # not keep an LLM slot taken while it handles the steps
+        reader = asyncio.create_task(self._read_steps(agent, history, queue))
+        try:
+            while (step := await queue.get()) is not None:
+                yield step
+            await reader
+        finally:
+            # A consumer that stops early, e.g. at OUTPUT, ends the generation
+            reader.cancel()
+            await asyncio.wait([reader])
+
+    async def _read_steps(
+        self, agent: Agent, history: History, queue: asyncio.Queue[Step | None]
+    ):
+        client = get_async_client(agent.provider)
+        try:
+            async with self._llm_calls:
+                if agent.structured:
+                    try:
+                        response = await client.chat.completions.parse(
+                            model=agent.model,
+                            messages=history.messages(),
+                            response_format=StepBatch if agent.batched else Step,
+                        )
+                    except ValueError:
+                        # A reply that does not validate counts as a failed step
+                        return
+                    parsed = response.choices[0].message.parsed
+                    if parsed is not None:
+                        for step in parsed.steps if agent.batched else [parsed]:
+                            queue.put_nowait(step)
+                    return
+
+                stream = await client.chat.completions.create(
+                    model=agent.model, messages=history.messages(), stream=True
+                )
+                parser = JsonObjectStream()
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        for obj in parser.feed(chunk.choices[0].delta.content):
+                            try:
+                                queue.put_nowait(Step.model_validate_json(obj))
+                            except ValueError:
+                                continue
+                finally:
+                    await stream.close()
+        finally:
+            queue.put_nowait(None)
+
+
+async def run_cli(agent: Agent):
+    """Answers one query typed on stdin, printing the steps as they come."""
+    engine = Engine()
+    try:
+        session = engine.create_session(agent)
+        async for step in session.run(input("> ")):
+            print(format_step(step))
+    finally:
+        engine.close()
@@ -0,0 +1,64 @@
+import asyncio
+import inspect
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "4"))
+
+
+class ToolExecutor:
+    """Runs the tool calls of one model turn side by side on a thread pool.
+
+    A failing or unknown tool becomes an error message for the model instead
+    of ending the run. Executors of many sessions can share one `pool`.
+    """
+
+    def __init__(
+        self,
+        tools: dict[str, Callable[[str], object]],
+        workers: int = TOOL_WORKERS,
+        pool: ThreadPoolExecutor | None = None,
+    ):
+        self.tools = tools
+        self._owns_pool = pool is None
+        self._pool = pool or ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="agent-tool"
+        )
+
+    def _error(self, tool: str, e: Exception | None = None) -> str:
+        if e is None:
+            return f"Error: unknown tool {tool}, available tools are {', '.join(self.tools)}"
+        return f"Error: {tool} failed with {type(e).__name__}: {e}"
+
+    def _call(self, tool: str, tool_input: str) -> str:
+        if tool not in self.tools:
+            return self._error(tool)
+        try:
+            return str(self.tools[tool](tool_input))
+        except Exception as e:
+            return self._error(tool, e)
+
+    async def _acall(self, tool: str, tool_input: str) -> str:
+        if not inspect.iscoroutinefunction(self.tools.get(tool)):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, self._call, tool, tool_input
+            )
+        try:
+            return str(await self.tools[tool](tool_input))
+        except Exception as e:
+            return self._error(tool, e)
+
+    def run(self, calls: list[tuple[str, str]]) -> list[str]:
+        """Outputs of the (tool, input) calls, in the order of the calls."""
+        if len(calls) == 1:
+            return [self._call(*calls[0])]
+        return list(self._pool.map(lambda call: self._call(*call), calls))
+
+    async def arun(self, calls: list[tuple[str, str]]) -> list[str]:
+        """Like `run`, coroutine tools run on the event loop, others on the pool."""
+        return list(await asyncio.gather(*(self._acall(*call) for call in calls)))
+
+    def close(self):
+        if self._owns_pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
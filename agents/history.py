@@ -0,0 +1,188 @@
+import json
+import os
+from functools import cache
+
+import tiktoken
+from openai.types.chat import ChatCompletionMessageParam
+
+# Tokens of the messages sent per step, the system prompt and the task included
+HISTORY_TOKENS = int(os.getenv("AGENT_HISTORY_TOKENS", "4000"))
+# Newest messages that are always sent verbatim
+KEEP_MESSAGES = int(os.getenv("AGENT_KEEP_MESSAGES", "8"))
+# Tool output beyond this is cut from the middle, the full text stays in History.outputs
+TOOL_OUTPUT_TOKENS = int(os.getenv("AGENT_TOOL_OUTPUT_TOKENS", "500"))
+# Characters each compacted step keeps in the summary
+SUMMARY_CHARS = 200
+
+
+@cache
+def get_encoder() -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def count_tokens(message: ChatCompletionMessageParam) -> int:
+    # Every message costs a few tokens of framing on top of its content
+    text = str(message.get("content") or "")
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"])
+    # Special token text such as <|endoftext|> in a message is counted as plain text
+    return 4 + len(get_encoder().encode(text, disallowed_special=()))
+
+
+def _shorten(text: str, limit: int = SUMMARY_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+class History:
+    """Messages of one agent run, compacted to stay within `budget` tokens.
+
+    The system prompt and the task, the first user message, are always sent. The newest
+    `keep` messages are sent as they are, older steps are collapsed into a
+    summary once the budget is exceeded. Tool outputs longer than
+    `tool_output_tokens` are cut and kept in `outputs` under their reference.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        budget: int = HISTORY_TOKENS,
+        keep: int = KEEP_MESSAGES,
+        tool_output_tokens: int = TOOL_OUTPUT_TOKENS,
+    ):
+        self.budget = budget
+        self.keep = keep
+        self.tool_output_tokens = tool_output_tokens
+        self.outputs: list[str] = []
+
+        self.pinned: list[ChatCompletionMessageParam] = [
+            {"role": "system", "content": system_prompt}
+        ]
+        self.summary: list[str] = []
+        self.omitted = 0
+        self.recent: list[ChatCompletionMessageParam] = []
+        self._tokens: list[int] = []
+        self._pinned_tokens = count_tokens(self.pinned[0])
+        self._summary_tokens = 0
+
+    def tokens(self) -> int:
+        return self._pinned_tokens + self._summary_tokens + sum(self._tokens)
+
+    def messages(self) -> list[ChatCompletionMessageParam]:
+        if not self.summary:
+            return self.pinned + self.recent
+        return self.pinned + [self._summary_message()] + self.recent
+
+    def _summary_message(self) -> ChatCompletionMessageParam:
+        lines = self.summary
+        if self.omitted:
+            lines = [f"- ({self.omitted} earlier steps omitted)"] + lines
+        return {
+            "role": "system",
+            "content": "Summary of the earlier steps:\n" + "\n".join(lines),
+        }
+
+    def append(self, message: ChatCompletionMessageParam):
+        if message["role"] == "user" and len(self.pinned) == 1 and not self.recent:
+            # The task is never compacted, the model needs it word for word
+            self.pinned.append(message)
+            self._pinned_tokens += count_tokens(message)
+            return
+
+        message = self._truncate_output(message)
+        self.recent.append(message)
+        self._tokens.append(count_tokens(message))
+        self._compact()
+
+    def _truncate_output(
+        self, message: ChatCompletionMessageParam
+    ) -> ChatCompletionMessageParam:
+        step = _step(message)
+        if step.get("step") == "OBSERVE":
+            if not step.get("output"):
+                return message
+            output = str(step["output"])
+        elif message["role"] == "tool":
+            # Native tool calls get the plain output
+            step = {}
+            output = str(message.get("content") or "")
+        else:
+            return message
+
+        encoder = get_encoder()
+        tokens = encoder.encode(output, disallowed_special=())
+        if len(tokens) <= self.tool_output_tokens:
+            return message
+
+        self.outputs.append(output)
+        # The start and the end of an output, e.g. a command and its error, say the most
+        half = self.tool_output_tokens // 2
+        output = (
+            encoder.decode(tokens[:half])
+            + f"\n[... {len(tokens) - 2 * half} tokens cut, full output is #{len(self.outputs) - 1} ...]\n"
+            + encoder.decode(tokens[-half:])
+        )
+        if not step:
+            return {**message, "content": output}
+        return {**message, "content": json.dumps({**step, "output": output})}
+
+    def _compact(self):
+        if self.tokens() <= self.budget:
+            return
+
+        while len(self.recent) > self.keep and self.tokens() > self.budget:
+            # Observations stay with the tool calls they answer, providers
+            # reject a tool result whose call is missing
+            count = 1
+            while count < len(self.recent) and _is_observation(self.recent[count]):
+                count += 1
+            for message in self.recent[:count]:
+                line = _summarize(message)
+                if line:
+                    self.summary.append(line)
+            del self.recent[:count], self._tokens[:count]
+            if self.summary:
+                self._summary_tokens = count_tokens(self._summary_message())
+
+        # The summary itself must not take over the budget on long runs
+        while len(self.summary) > 1 and self._summary_tokens > self.budget // 4:
+            del self.summary[0]
+            self.omitted += 1
+            self._summary_tokens = count_tokens(self._summary_message())
+
+
+def _step(message: ChatCompletionMessageParam) -> dict:
+    try:
+        step = json.loads(str(message.get("content") or ""))
+    except ValueError:
+        return {}
+    return step if isinstance(step, dict) else {}
+
+
+def _is_observation(message: ChatCompletionMessageParam) -> bool:
+    return message["role"] == "tool" or _step(message).get("step") == "OBSERVE"
+
+
+def _summarize(message: ChatCompletionMessageParam) -> str | None:
+    if message["role"] == "user":
+        return f"- USER: {_shorten(message.get('content'))}"
+    if message.get("tool_calls"):
+        return "- TOOL " + "; ".join(
+            f"{call['function']['name']}({_shorten(call['function']['arguments'], 100)})"
+            for call in message["tool_calls"]
+        )
+
+    step = _step(message)
+    kind = step.get("step")
+    if kind == "TOOL":
+        return f"- TOOL {step.get('tool')}({_shorten(step.get('input'), 100)})"
+    if kind == "OBSERVE":
+        return f"- OBSERVE {step.get('tool')}: {_shorten(step.get('output'))}"
+    if kind in ("START", "PLAN", "OUTPUT") and step.get("content"):
+        return f"- {kind}: {_shorten(step['content'])}"
+    if message["role"] == "tool":
+        return f"- OBSERVE: {_shorten(message.get('content'))}"
+    if message["role"] == "assistant" and not step and message.get("content"):
+        return f"- OUTPUT: {_shorten(message['content'])}"
+    # Retry nudges and other system messages carry nothing for later steps
+    return None
@@ -0,0 +1,66 @@
+import json
+import os
+from contextlib import asynccontextmanager
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from prompts.chain_of_thoughts import agent as chain_of_thoughts_agent
+from weather_agent.main import agent as weather_agent
+from .engine import Agent, Engine
+
+AGENTS: dict[str, Agent] = {
+    "chain_of_thoughts": chain_of_thoughts_agent,
+    "weather": weather_agent,
+}
+# The coding agent runs any shell command it likes on this machine
+if os.getenv("AGENT_SERVER_SHELL") == "1":
+    from coding_agent.main import agent as coding_agent
+
+    AGENTS["coding"] = coding_agent
+
+engine = Engine()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    engine.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/")
+async def root():
+    return {"status": "Server running", "agents": list(AGENTS)}
+
+
+@app.post("/sessions")
+async def create_session(agent: str = Body(..., embed=True)):
+    if agent not in AGENTS:
+        raise HTTPException(404, f"Unknown agent, available are {', '.join(AGENTS)}")
+    return {"session_id": engine.create_session(AGENTS[agent]).id}
+
+
+@app.post("/sessions/{session_id}/messages")
+async def send_message(session_id: str, content: str = Body(..., embed=True)):
+    """Streams the steps of the answer as server-sent events."""
+    session = engine.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(404, "Session not found")
+
+    async def events():
+        async for step in session.run(content):
+            yield f"data: {json.dumps(step.model_dump(exclude_none=True))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if session_id not in engine.sessions:
+        raise HTTPException(404, "Session not found")
+    engine.close_session(session_id)
+    return {"status": "deleted"}
+
+
+# uvicorn agents.server:app --port 8002
@@ -0,0 +1,238 @@
+import os
+import selectors
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+from pydantic import BaseModel
+
+COMMAND_TIMEOUT = float(os.getenv("AGENT_COMMAND_TIMEOUT", "60"))
+# Bytes of stdout and of stderr each command keeps, the rest is counted only
+MAX_OUTPUT = int(os.getenv("AGENT_MAX_OUTPUT", "16000"))
+
+
+class CommandResult(BaseModel):
+    command: str
+    exit_code: int | None
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    timeout: float | None = None
+
+    def __str__(self) -> str:
+        if self.timed_out:
+            status = (
+                f"Command timed out after {self.timeout:g} s, "
+                "the shell was restarted in the same directory"
+            )
+        else:
+            status = f"Ran command with exit code {self.exit_code}"
+        parts = [status]
+        if self.stdout:
+            parts.append(f"stdout:\n{self.stdout.rstrip()}")
+        if self.stderr:
+            parts.append(f"stderr:\n{self.stderr.rstrip()}")
+        return "\n".join(parts)
+
+
+class _Output:
+    """Keeps the first `limit` bytes of a stream and counts the others."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.data = bytearray()
+        self.dropped = 0
+
+    def add(self, data: bytes):
+        room = self.limit - len(self.data)
+        self.data += data[:room]
+        self.dropped += max(0, len(data) - room)
+
+    def text(self) -> str:
+        text = self.data.decode("utf-8", "replace")
+        if self.dropped:
+            text += f"\n[... {self.dropped} more bytes]"
+        return text
+
+
+class ShellSession:
+    """One long running bash, so cwd, variables and functions carry over
+    between commands without starting a shell for each."""
+
+    def __init__(
+        self,
+        cwd: str | None = None,
+        timeout: float = COMMAND_TIMEOUT,
+        max_output: int = MAX_OUTPUT,
+    ):
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.timeout = timeout
+        self.max_output = max_output
+        self._lock = threading.Lock()
+        self._process: subprocess.Popen | None = None
+
+    def _start(self):
+        self._marker = uuid.uuid4().hex
+        self._process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Its own process group, so a timeout can kill whatever the command started
+            start_new_session=True,
+        )
+        # A command that ends the shell, e.g. with exit, still reports its status and cwd
+        self._process.stdin.write(f"trap '{self._end_marker('exit')}' EXIT\n".encode())
+
+    def _end_marker(self, then: str) -> str:
+        # `then` tells whether the shell takes the next command or exits
+        return (
+            f'__status=$?; printf "\\n{self._marker} %d {then} %s\\n" "$__status" "$PWD"; '
+            f'printf "\\n{self._marker}\\n" >&2'
+        )
+
+    def run(self, command: str, timeout: float | None = None) -> CommandResult:
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            return self._run(command, self.timeout if timeout is None else timeout)
+
+    def _run(self, command: str, timeout: float) -> CommandResult:
+        process = self._process
+        marker = self._marker.encode()
+        # Commands must not read the script the shell itself is reading from stdin
+        script = f"{{\n{command}\n}} </dev/null\n{self._end_marker('next')}\n"
+        try:
+            process.stdin.write(script.encode())
+            process.stdin.flush()
+        except BrokenPipeError:
+            pass
+
+        outputs = {
+            process.stdout: _Output(self.max_output),
+            process.stderr: _Output(self.max_output),
+        }
+        # Only the end of each stream is searched for the marker, the output can be huge
+        tails = {process.stdout: b"", process.stderr: b""}
+        exit_code = None
+        open_streams = set(outputs)
+        deadline = time.monotonic() + timeout
+
+        with selectors.DefaultSelector() as selector:
+            for stream in outputs:
+                selector.register(stream, selectors.EVENT_READ)
+
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close()
+                    for stream in open_streams:
+                        outputs[stream].add(tails[stream])
+                    return CommandResult(
+                        command=command,
+                        exit_code=None,
+                        stdout=outputs[process.stdout].text(),
+                        stderr=outputs[process.stderr].text(),
+                        timed_out=True,
+                        timeout=timeout,
+                    )
+
+                for key, _ in selector.select(remaining):
+                    stream = key.fileobj
+                    data = os.read(stream.fileno(), 65536)
+                    if not data:
+                        # The command ended the shell, e.g. with exit
+                        selector.unregister(stream)
+                        open_streams.discard(stream)
+                        outputs[stream].add(tails[stream])
+                        exit_code = process.wait()
+                        continue
+
+                    tail = tails[stream] + data
+                    end = tail.find(b"\n" + marker)
+                    if end == -1:
+                        # Hold back what could be the start of a marker split across reads
+                        outputs[stream].add(tail[: -len(marker) - 1])
+                        tails[stream] = tail[-len(marker) - 1 :]
+                        continue
+
+                    outputs[stream].add(tail[:end])
+                    tails[stream] = tail = tail[end:]
+                    if stream is process.stdout:
+                        line_end = tail.find(b"\n", 1)
+                        if line_end == -1:
+                            continue
+                        _, status, then, self.cwd = (
+                            tail[1:line_end].decode().split(" ", 3)
+                        )
+                        exit_code = int(status)
+                        if then == "exit":
+                            # Reaped now, so the next command starts a new shell
+                            process.wait()
+                    selector.unregister(stream)
+                    open_streams.discard(stream)
+
+        return CommandResult(
+            command=command,
+            exit_code=exit_code,
+            stdout=outputs[process.stdout].text(),
+            stderr=outputs[process.stderr].text(),
+        )
+
+    def close(self):
+        if self._process is None or self._process.poll() is not None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._process.wait()
+
+
+class ShellPool:
+    """Shell sessions that run independent commands side by side.
+
+    Commands take an idle session or start one, up to `size`. Each command
+    starts in the directory the last finished one ended in, but variables,
+    functions and a cd of a command still running stay with its session, so
+    commands that build on each other belong in one ShellSession.
+    """
+
+    def __init__(self, size: int = 4, cwd: str | None = None, **session_kwargs):
+        self.size = size
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.session_kwargs = session_kwargs
+        self.sessions: list[ShellSession] = []
+        self._idle: list[ShellSession] = []
+        self._available = threading.Condition()
+
+    def _acquire(self) -> ShellSession:
+        with self._available:
+            while not self._idle and len(self.sessions) >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            session = ShellSession(self.cwd, **self.session_kwargs)
+            self.sessions.append(session)
+            return session
+
+    def run(self, command: str, timeout: float | None = None) -> CommandResult:
+        session = self._acquire()
+        try:
+            if session.cwd != self.cwd:
+                session.run(f"cd {shlex.quote(self.cwd)}")
+            result = session.run(command, timeout)
+            self.cwd = session.cwd
+            return result
+        finally:
+            with self._available:
+                self._idle.append(session)
+                self._available.notify()
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
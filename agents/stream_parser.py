@@ -0,0 +1,61 @@
+THINK_START = "<think>"
+THINK_END = "</think>"
+
+
+class JsonObjectStream:
+    """Finds the top level JSON objects in text that arrives in pieces.
+
+    Braces inside strings, escaped quotes included, do not count, and
+    <think> blocks between objects are skipped. `feed` returns each object
+    as soon as its closing brace arrives, so a step can be acted on while
+    the rest of the reply is still being generated.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.in_think = False
+        self._object: list[str] = []
+        # The last characters outside objects, to spot tags split across pieces
+        self._tail = ""
+
+    def feed(self, text: str) -> list[str]:
+        objects = []
+        for char in text:
+            if self.depth == 0:
+                if not self.in_think and char == "{":
+                    self.depth = 1
+                    self._object = [char]
+                    self._tail = ""
+                    continue
+
+                tag = THINK_END if self.in_think else THINK_START
+                self._tail = (self._tail + char)[-len(tag) :]
+                if self._tail == tag:
+                    self.in_think = not self.in_think
+                    self._tail = ""
+                continue
+
+            self._object.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    objects.append("".join(self._object))
+                    self._object = []
+        return objects
+
+
+def extract_json_objects(text: str) -> list[str]:
+    return JsonObjectStream().feed(text)
@@ -0,0 +1,50 @@
+import inspect
+import types
+import typing
+from collections.abc import Callable
+
+JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+
+def _json_type(annotation) -> dict:
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        # Optional[X] is X for the model, leaving the argument out means None
+        return _json_type(next(a for a in args if a is not type(None)))
+    if typing.get_origin(annotation) is list and args:
+        return {"type": "array", "items": _json_type(args[0])}
+    origin = typing.get_origin(annotation) or annotation
+    return {"type": JSON_TYPES.get(origin, "string")}
+
+
+def tool_schema(name: str, function: Callable) -> dict:
+    """OpenAI tools entry for `function`, built from its signature and docstring."""
+    hints = typing.get_type_hints(function)
+    properties = {}
+    required = []
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        properties[parameter.name] = _json_type(hints.get(parameter.name, str))
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": inspect.getdoc(function) or name,
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": required,
+            },
+        },
+    }
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from .fake_llm import FakeLLMServer
+from .rag_queue_load import WordEncoder
+
+PROTOCOLS = {
+    "steps": {"batched": False, "native_tools": False},
+    "batched": {"batched": True, "native_tools": False},
+    "native": {"batched": False, "native_tools": True},
+}
+
+parser = argparse.ArgumentParser(
+    description="Turns, tokens and latency per task of the agent tool protocols, fully offline"
+)
+parser.add_argument("--tasks", type=int, default=50, help="Tasks per protocol")
+parser.add_argument("--concurrency", type=int, default=10)
+parser.add_argument("--llm-latency", type=float, default=0.3)
+parser.add_argument("--token-interval", type=float, default=0.002)
+parser.add_argument("--plan-steps", type=int, default=5)
+parser.add_argument("--tool-calls", type=int, default=2)
+parser.add_argument("--tool-latency", type=float, default=0.2)
+parser.add_argument(
+    "--malformed",
+    type=float,
+    default=0.05,
+    help="Share of JSON step replies and tool call arguments that are not valid JSON",
+)
+
+
+async def run_task(engine, agent, query: str) -> dict:
+    session = engine.create_session(agent)
+    start = time.perf_counter()
+    try:
+        steps = [step async for step in session.run(query)]
+    finally:
+        engine.close_session(session.id)
+    return {
+        "latency": time.perf_counter() - start,
+        "ok": bool(steps) and steps[-1].step == "OUTPUT",
+    }
+
+
+async def run_protocol(args, llm: FakeLLMServer, protocol: str) -> dict:
+    from agents import Agent, Engine
+    from weather_agent.main import SYSTEM_PROMPT
+
+    def get_weather(city: str) -> str:
+        """Current weather of a city."""
+        time.sleep(args.tool_latency)
+        return f"The weather in {city} is Sunny +21°C"
+
+    # Every protocol gets the same prompt, so token counts differ by protocol only
+    agent = Agent(
+        SYSTEM_PROMPT,
+        native_prompt=SYSTEM_PROMPT,
+        model="bench",
+        tools=lambda session: {"get_weather": get_weather},
+        **PROTOCOLS[protocol],
+    )
+    engine = Engine()
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def task(i: int) -> dict:
+        async with limit:
+            return await run_task(engine, agent, f"What is the weather in city {i}?")
+
+    with llm._lock:
+        llm.requests = llm.prompt_tokens = llm.completion_tokens = 0
+    try:
+        results = await asyncio.gather(*(task(i) for i in range(args.tasks)))
+    finally:
+        engine.close()
+
+    return {
+        "turns": llm.requests / args.tasks,
+        "prompt_tokens": llm.prompt_tokens / args.tasks,
+        "completion_tokens": llm.completion_tokens / args.tasks,
+        "latencies": [r["latency"] for r in results],
+        "ok": sum(r["ok"] for r in results),
+    }
+
+
+async def run_all(args, llm: FakeLLMServer) -> dict[str, dict]:
+    # One event loop for all protocols, the async client is cached across them
+    return {protocol: await run_protocol(args, llm, protocol) for protocol in PROTOCOLS}
+
+
+def main():
+    args = parser.parse_args()
+    llm = FakeLLMServer(
+        ("127.0.0.1", 0),
+        args.llm_latency,
+        token_interval=args.token_interval,
+        plan_steps=args.plan_steps,
+        tool_calls=args.tool_calls,
+        malformed=args.malformed,
+    ).start()
+    os.environ["OPENROUTER_BASE_URL"] = llm.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    from agents import history
+
+    try:
+        history.get_encoder()
+    except Exception:
+        print("tiktoken vocabulary not available, counting words as tokens")
+        history.get_encoder = WordEncoder
+
+    results = asyncio.run(run_all(args, llm))
+
+    print(
+        f"{args.tasks} tasks per protocol, {args.concurrency} at a time, "
+        f"{args.plan_steps} plan steps and {args.tool_calls} tool calls per task, "
+        f"{args.malformed:.0%} malformed JSON\n"
+    )
+    print(
+        f"{'protocol':<10} {'turns':>7} {'prompt':>8} {'completion':>10} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'ok':>5}"
+    )
+    for protocol, result in results.items():
+        p50, p95 = np.percentile(np.asarray(result["latencies"]) * 1000, [50, 95])
+        print(
+            f"{protocol:<10} {result['turns']:>7.1f} {result['prompt_tokens']:>8.0f} "
+            f"{result['completion_tokens']:>10.0f} {p50:>8.1f} {p95:>8.1f} "
+            f"{result['ok']:>5}"
+        )
+
+
+# python -m bench.agent_protocols --tasks 100 --malformed 0.1
+if __name__ == "__main__":
+    main()
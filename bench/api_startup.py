@@ -0,0 +1,103 @@
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+
+parser = argparse.ArgumentParser(
+    description="Time until the rag_queue API process is ready to serve"
+)
+parser.add_argument("--runs", type=int, default=5)
+
+# Prints the import time and peak RSS of a fresh interpreter importing `module`
+IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE, module],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_ready(timeout: float = 60.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "rag_queue.server:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+    )
+
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("API did not become ready")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    args = parser.parse_args()
+
+    rows = []
+    for module in ["rag_queue.server", "rag_queue.queues.worker"]:
+        samples = [measure_import(module) for _ in range(args.runs)]
+        rows.append(
+            (
+                f"import {module}",
+                np.median([s["seconds"] for s in samples]),
+                np.median([s["max_rss_mb"] for s in samples]),
+            )
+        )
+
+    ready = [measure_ready() for _ in range(args.runs)]
+    rows.append(("uvicorn ready to serve /", np.median(ready), float("nan")))
+
+    print(f"median of {args.runs} runs\n")
+    print(f"{'':<38} {'seconds':>8} {'RSS MB':>8}")
+    for name, seconds, rss in rows:
+        print(f"{name:<38} {seconds:>8.3f} {rss:>8.1f}")
+
+
+# python -m bench.api_startup
+if __name__ == "__main__":
+    main()
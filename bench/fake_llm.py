@@ -0,0 +1,270 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+parser = argparse.ArgumentParser(
+    description="OpenAI compatible chat completions server with a fixed latency"
+)
+parser.add_argument("--port", type=int, default=8001)
+parser.add_argument("--latency", type=float, default=0.5, help="Seconds to first token")
+parser.add_argument("--tokens", type=int, default=50, help="Tokens per answer")
+parser.add_argument("--token-interval", type=float, default=0.01)
+parser.add_argument(
+    "--plan-steps", type=int, default=5, help="PLAN steps of an agent before its tools"
+)
+parser.add_argument(
+    "--tool-calls", type=int, default=2, help="Independent tool calls per agent task"
+)
+parser.add_argument(
+    "--malformed",
+    type=float,
+    default=0.0,
+    help="Share of JSON step replies and tool call arguments that are not valid JSON",
+)
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Answers every POST .../chat/completions after `latency` seconds with
+    `tokens` words, streamed `token_interval` apart when the request asks to stream.
+
+    Requests with `tools` or a Step / StepBatch response_format get the
+    replies of an agent instead, see `agent_message`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        latency: float = 0.5,
+        tokens: int = 50,
+        token_interval: float = 0.01,
+        plan_steps: int = 5,
+        tool_calls: int = 2,
+        malformed: float = 0.0,
+    ):
+        super().__init__(address, FakeLLMHandler)
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.plan_steps = plan_steps
+        self.tool_calls = tool_calls
+        self.malformed = malformed
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    server: FakeLLMServer
+    protocol_version = "HTTP/1.1"
+    # Tokens are tiny writes, Nagle's algorithm would hold them back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        words = [f"word{i} " for i in range(self.server.tokens)]
+        message = {"role": "assistant", "content": "".join(words)}
+        completion_tokens = len(words)
+        if request.get("tools") or request.get("response_format"):
+            message = agent_message(self.server, request)
+            completion_tokens = count_words(message)
+
+        prompt = request["messages"] + request.get("tools", [])
+        usage = {
+            "prompt_tokens": count_words(prompt),
+            "completion_tokens": completion_tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with self.server._lock:
+            self.server.requests += 1
+            self.server.prompt_tokens += usage["prompt_tokens"]
+            self.server.completion_tokens += usage["completion_tokens"]
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "created": int(time.time()),
+            "model": request["model"],
+        }
+
+        time.sleep(self.server.latency)
+
+        if not request.get("stream"):
+            time.sleep(self.server.token_interval * completion_tokens)
+            finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+            self._send_json(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {"index": 0, "message": message, "finish_reason": finish_reason}
+                    ],
+                    "usage": usage,
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_interval)
+            delta = {"content": word, **({"role": "assistant"} if i == 0 else {})}
+            self._send_event(
+                {
+                    **chunk,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+            )
+        self._send_event(
+            {
+                **chunk,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+        )
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**chunk, "choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_json(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, body: dict):
+        self._send_chunk(f"data: {json.dumps(body)}\n\n".encode())
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def count_words(value) -> int:
+    """Words of the text in a message or other JSON value, standing in for tokens."""
+    if isinstance(value, dict):
+        return sum(count_words(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(count_words(v) for v in value)
+    return len(str(value).split()) if value is not None else 0
+
+
+def agent_message(server: FakeLLMServer, request: dict) -> dict:
+    """The next reply of an agent that plans `plan_steps` steps, makes
+    `tool_calls` independent tool calls and then answers.
+
+    It follows the protocol the request asks for: native tool calls when it
+    has `tools`, one JSON step per reply for a Step response_format, and
+    all steps up to the next tool call for StepBatch. Every protocol writes
+    the same plan and answer, and `malformed` breaks a JSON step reply or
+    the arguments of a tool call at the same rate.
+    """
+    messages = request["messages"]
+    last_user = max(i for i, m in enumerate(messages) if m["role"] == "user")
+    turn = messages[last_user + 1 :]
+    observed = any(m["role"] == "tool" for m in turn)
+
+    plan = [{"step": "START", "content": "The user asks a question"}] + [
+        {"step": "PLAN", "content": f"Planning step {i} of the answer"}
+        for i in range(server.plan_steps)
+    ]
+    answer = [
+        {"step": "PLAN", "content": "The tool output has what we need"},
+        {"step": "OUTPUT", "content": "The answer from the tool output"},
+    ]
+
+    if request.get("tools"):
+        # The same plan and answer, as the content next to the tool calls
+        content = " ".join(step["content"] for step in plan)
+        inputs = [f"query {i}" for i in range(server.tool_calls)]
+        if observed:
+            last_calls = max(i for i, m in enumerate(turn) if m.get("tool_calls"))
+            failed = [
+                m for m in turn[last_calls + 1 :] if m["content"].startswith("Error")
+            ]
+            if not failed:
+                content = " ".join(step["content"] for step in answer)
+                return {"role": "assistant", "content": content}
+            # Calls whose arguments did not parse are made again
+            content = None
+            inputs = [f"query retry {i}" for i in range(len(failed))]
+        return {
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
+                tool_call(request["tools"][0]["function"], tool_input, server.malformed)
+                for tool_input in inputs
+            ],
+        }
+
+    tool_steps = [
+        {"step": "TOOL", "tool": "get_weather", "input": f"query {i}"}
+        for i in range(server.tool_calls)
+    ]
+    if request["response_format"]["json_schema"]["name"] == "StepBatch":
+        content = {"steps": answer if observed else plan + tool_steps}
+    else:
+        steps = plan + tool_steps + answer
+        content = steps[sum(m["role"] == "assistant" for m in turn)]
+    if random.random() < server.malformed:
+        return {"role": "assistant", "content": json.dumps(content)[:-2]}
+    return {"role": "assistant", "content": json.dumps(content)}
+
+
+def tool_call(tool: dict, tool_input: str, malformed: float) -> dict:
+    argument = next(iter(tool["parameters"]["properties"]), "input")
+    arguments = json.dumps({argument: tool_input})
+    if random.random() < malformed:
+        arguments = arguments[:-2]
+    return {
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": tool["name"], "arguments": arguments},
+    }
+
+
+def main():
+    args = parser.parse_args()
+    server = FakeLLMServer(
+        ("127.0.0.1", args.port),
+        args.latency,
+        args.tokens,
+        args.token_interval,
+        args.plan_steps,
+        args.tool_calls,
+        args.malformed,
+    )
+    print(f"Fake LLM listening on {server.base_url}")
+    server.serve_forever()
+
+
+# python -m bench.fake_llm, then GEMINI_BASE_URL=http://127.0.0.1:8001/v1/
+if __name__ == "__main__":
+    main()
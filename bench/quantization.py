@@ -0,0 +1,129 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rag.numpy_store import approximate_scores, int8_scale, quantize
+from rag.vector_store import DEFAULT_NUMPY_INDEX
+
+parser = argparse.ArgumentParser(
+    description="Recall@k, memory and latency of quantized search over a numpy index"
+)
+parser.add_argument("--index", type=Path, default=DEFAULT_NUMPY_INDEX)
+parser.add_argument(
+    "--queries",
+    type=Path,
+    default=None,
+    help="File with one question per line, defaults to perturbed corpus vectors",
+)
+parser.add_argument("--num-queries", type=int, default=200)
+parser.add_argument("--noise", type=float, default=0.05)
+parser.add_argument("-k", type=int, default=3)
+parser.add_argument("--oversampling", type=float, nargs="*", default=[1.0, 2.0, 4.0])
+
+
+def load_vectors(path: Path) -> np.ndarray:
+    meta = json.loads((path / "meta.json").read_text())
+    vectors = np.fromfile(path / "vectors.bin", dtype=meta["dtype"])
+    return vectors.reshape(meta["count"], meta["dim"]).astype(np.float32)
+
+
+def load_queries(args, vectors: np.ndarray) -> np.ndarray:
+    if args.queries:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        embedding_model = HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        )
+        questions = [q for q in args.queries.read_text().splitlines() if q.strip()]
+        queries = np.asarray(embedding_model.embed_documents(questions), np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(
+            len(vectors), min(args.num_queries, len(vectors)), replace=False
+        )
+        queries = vectors[rows] + args.noise * rng.normal(
+            size=(len(rows), vectors.shape[1])
+        )
+
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def run(search, queries: np.ndarray, truth: list[set], k: int) -> tuple[float, list]:
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & set(rows[:k].tolist()))
+    return hits / (len(queries) * k), latencies
+
+
+def main():
+    args = parser.parse_args()
+    k = args.k
+    vectors = load_vectors(args.index)
+    queries = load_queries(args, vectors)
+    truth = [set(top_k(vectors @ query, k).tolist()) for query in queries]
+
+    half = vectors.astype(np.float16)
+    # Widened once, like the codes below the row times the search and not the
+    # conversion, recall and RAM are those of float16 storage
+    half_scores = half.astype(np.float32)
+    scale = int8_scale(vectors)
+    codes = {
+        "int8": quantize(vectors, "int8", scale),
+        "binary": quantize(vectors, "binary"),
+    }
+
+    results = [
+        (
+            "float32",
+            "-",
+            *run(lambda q: top_k(vectors @ q, k), queries, truth, k),
+            vectors.nbytes,
+        ),
+        (
+            "float16",
+            "-",
+            *run(lambda q: top_k(half_scores @ q, k), queries, truth, k),
+            half.nbytes,
+        ),
+    ]
+
+    for mode, mode_codes in codes.items():
+        for oversampling in args.oversampling:
+            candidates = max(k, int(k * oversampling))
+
+            def search(query, mode=mode, mode_codes=mode_codes, candidates=candidates):
+                rows = top_k(
+                    approximate_scores(mode_codes, query, mode, scale), candidates
+                )
+                # Rescore the candidates at full precision, as the store does from disk
+                return rows[np.argsort(-(vectors[rows] @ query))]
+
+            results.append(
+                (mode, oversampling, *run(search, queries, truth, k), mode_codes.nbytes)
+            )
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{k}\n")
+    print(
+        f"{'mode':<8} {'oversample':>10} {'recall':>8} {'RAM MB':>8} {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for mode, oversampling, recall, latencies, nbytes in results:
+        print(
+            f"{mode:<8} {oversampling:>10} {recall:>8.3f} {nbytes / 2**20:>8.2f} "
+            f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 95):>8.3f}"
+        )
+
+
+# python -m bench.quantization --index rag/numpy_index
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .fake_llm import FakeLLMServer
+
+ROOT = Path(__file__).parent.parent
+ENDED = {"finished", "failed", "stopped", "canceled"}
+
+parser = argparse.ArgumentParser(
+    description="End-to-end latency and throughput of server -> rq -> worker, fully offline"
+)
+parser.add_argument("--queries", type=Path, default=ROOT / "requests.jsonl")
+parser.add_argument(
+    "--field",
+    default=None,
+    help="JSON field holding the query, defaults to query or else title",
+)
+parser.add_argument("--count", type=int, default=200, help="Requests to send")
+parser.add_argument("--rate", type=float, default=20.0, help="Requests per second")
+parser.add_argument(
+    "--unique",
+    action="store_true",
+    help="Make every query distinct, so none is deduplicated or cached",
+)
+parser.add_argument("--priority", default="interactive")
+parser.add_argument(
+    "--redis-url",
+    default=None,
+    help="Use this Redis instead of an in-process fakeredis, its data is flushed. "
+    "fakeredis serializes every command in Python, so it adds to the latencies.",
+)
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--batch-size", type=int, default=1)
+parser.add_argument("--docs", type=int, default=2000, help="Chunks in the vector store")
+parser.add_argument(
+    "--embed-latency", type=float, default=0.005, help="Seconds per encoder call"
+)
+parser.add_argument("--llm-latency", type=float, default=0.5)
+parser.add_argument("--llm-tokens", type=int, default=50)
+parser.add_argument("--llm-token-interval", type=float, default=0.01)
+parser.add_argument("--seed", type=int, default=0)
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic random unit vectors standing in for the sentence transformer."""
+
+    model_name = "bench-hash"
+
+    def __init__(self, dim: int = 384, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8])
+        vector = np.random.default_rng(seed).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class WordEncoder:
+    """Stand-in for the tiktoken encoding when its vocabulary can't be downloaded."""
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return text.split(" ")
+
+    def decode(self, tokens: list[str]) -> str:
+        return " ".join(tokens)
+
+
+def load_queries(args) -> list[str]:
+    rows = [json.loads(line) for line in args.queries.read_text().splitlines() if line]
+    texts = [
+        row[args.field] if args.field else row.get("query", row["title"])
+        for row in rows
+    ]
+
+    rng = np.random.default_rng(args.seed)
+    queries = [texts[i] for i in rng.integers(len(texts), size=args.count)]
+    if args.unique:
+        queries = [f"{query} ({i})" for i, query in enumerate(queries)]
+    return queries
+
+
+def build_index(path: Path, docs: int, embedding: HashEmbeddings):
+    from rag.numpy_store import NumpyIndexWriter
+
+    rng = np.random.default_rng(0)
+    words = [f"term{i}" for i in range(500)]
+    writer = NumpyIndexWriter(path)
+    for start in range(0, docs, 256):
+        chunks = [
+            Document(
+                page_content=" ".join(rng.choice(words, size=150)),
+                metadata={
+                    "source": "bench.pdf",
+                    "page": i // 4,
+                    "page_label": str(i // 4 + 1),
+                },
+            )
+            for i in range(start, min(start + 256, docs))
+        ]
+        writer.add(
+            chunks,
+            embedding.embed_documents([chunk.page_content for chunk in chunks]),
+            [str(uuid.uuid4()) for _ in chunks],
+        )
+    writer.close()
+
+
+def configure(args, workdir: Path, llm: FakeLLMServer):
+    # The rag_queue modules read their settings at import time
+    os.environ.update(
+        {
+            "GEMINI_API_KEY": "bench",
+            "GEMINI_BASE_URL": llm.base_url,
+            "VECTOR_STORE": "numpy",
+            "NUMPY_INDEX_PATH": str(workdir / "numpy_index"),
+            "HYBRID_SEARCH": "0",
+            "EMBEDDING_CACHE_DIR": str(workdir / "embedding_cache"),
+            "RAG_BATCH_SIZE": str(args.batch_size),
+        }
+    )
+    # Only the pipeline is measured, a single bench client must not hit its quota
+    os.environ.setdefault("RAG_CLIENT_QUOTA", str(10**9))
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+
+    from rag_queue.client import rq_client
+
+    if args.redis_url:
+        rq_client.redis_connection.flushdb()
+        return
+
+    import fakeredis
+    from rq import Queue
+
+    server = fakeredis.FakeServer()
+    rq_client.redis_connection = fakeredis.FakeRedis(server=server)
+    rq_client.async_redis = fakeredis.FakeAsyncRedis(server=server)
+    rq_client.interactive_queue = Queue(
+        "interactive", connection=rq_client.redis_connection
+    )
+    rq_client.batch_queue = Queue("batch", connection=rq_client.redis_connection)
+    rq_client.queues = [rq_client.interactive_queue, rq_client.batch_queue]
+
+
+def start_workers(args, embedding: HashEmbeddings) -> dict[str, float]:
+    from rq import SimpleWorker
+    from rq.timeouts import TimerDeathPenalty
+
+    from rag import context
+    from rag.embedding_cache import CachedEmbeddings
+    from rag_queue.client import rq_client
+    from rag_queue.queues import worker
+    from rag_queue.queues.batch_worker import BatchWorker
+
+    cached = CachedEmbeddings(embedding)
+    worker.get_embedding_model = lambda: cached
+
+    try:
+        context.get_encoder()
+    except Exception:
+        print("tiktoken vocabulary not available, counting words as tokens")
+        context.get_encoder = WordEncoder
+
+    # rq sets started_at only once a job runs, which for a batch is after the
+    # whole batch was answered, so the time a job leaves the queue is kept here
+    dequeued_at: dict[str, float] = {}
+
+    class ThreadWorker(BatchWorker if args.batch_size > 1 else SimpleWorker):
+        # Signals only work in the main thread
+        death_penalty_class = TimerDeathPenalty
+
+        def _install_signal_handlers(self):
+            pass
+
+        def execute_job(self, job, queue):
+            dequeued_at.setdefault(job.id, time.time())
+            super().execute_job(job, queue)
+
+        def _collect_batch(self):
+            batch = super()._collect_batch()
+            for job, _ in batch:
+                dequeued_at.setdefault(job.id, time.time())
+            return batch
+
+    for _ in range(args.workers):
+        rq_worker = ThreadWorker(
+            rq_client.queues, connection=rq_client.redis_connection
+        )
+        threading.Thread(
+            target=rq_worker.work, kwargs={"logging_level": "WARNING"}, daemon=True
+        ).start()
+
+    return dequeued_at
+
+
+def start_server() -> str:
+    import uvicorn
+
+    from rag_queue.server import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+async def send(client, query: str, priority: str) -> dict:
+    sent = time.perf_counter()
+    response = await client.post("/chat", params={"query": query, "priority": priority})
+    if response.status_code == 429:
+        return {"status": "rejected"}
+
+    body = response.json()
+    status = {"status": body["status"]}
+    while status["status"] not in ENDED:
+        response = await client.get(
+            "/job-status", params={"job_id": body["job_id"], "wait": 30}
+        )
+        status = response.json()
+
+    return {
+        "status": status["status"],
+        "job_id": body["job_id"],
+        "deduplicated": body["deduplicated"],
+        "latency": time.perf_counter() - sent,
+        "done": time.perf_counter(),
+    }
+
+
+async def run_load(base_url: str, queries: list[str], rate: float, priority: str):
+    import httpx
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=None, limits=limits
+    ) as client:
+        start = time.perf_counter()
+        tasks = []
+        # Open loop, requests go out on schedule however slow the answers are
+        for i, query in enumerate(queries):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, query, priority)))
+
+        return start, await asyncio.gather(*tasks)
+
+
+def queue_waits(job_ids: list[str], dequeued_at: dict[str, float]) -> list[float]:
+    from rq.job import Job
+
+    from rag_queue.client import rq_client
+
+    jobs = Job.fetch_many(job_ids, connection=rq_client.redis_connection)
+    return [
+        dequeued_at[job.id] - job.enqueued_at.timestamp()
+        for job in jobs
+        if job is not None and job.id in dequeued_at
+    ]
+
+
+def stage_means() -> dict[str, float]:
+    from rag_queue.client import rq_client
+    from rag_queue.metrics import METRICS_KEY
+
+    values = {
+        field.decode(): float(value)
+        for field, value in rq_client.redis_connection.hgetall(METRICS_KEY).items()
+    }
+    means = {}
+    for field, count in values.items():
+        if field.startswith("rag_stage_duration_seconds_count"):
+            stage = field[field.index("{") :]
+            means[stage[8:-2]] = (
+                values[f"rag_stage_duration_seconds_sum{stage}"] / count
+            )
+    return means
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}"
+
+
+def main():
+    args = parser.parse_args()
+    queries = load_queries(args)
+    embedding = HashEmbeddings(latency=args.embed_latency)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        llm = FakeLLMServer(
+            ("127.0.0.1", 0),
+            args.llm_latency,
+            args.llm_tokens,
+            args.llm_token_interval,
+        ).start()
+
+        configure(args, workdir, llm)
+        build_index(workdir / "numpy_index", args.docs, embedding)
+        dequeued_at = start_workers(args, embedding)
+        base_url = start_server()
+
+        start, results = asyncio.run(
+            run_load(base_url, queries, args.rate, args.priority)
+        )
+
+    answered = [r for r in results if r["status"] != "rejected"]
+    finished = [r for r in answered if r["status"] == "finished"]
+    jobs = {r["job_id"] for r in answered if not r["deduplicated"]}
+    elapsed = max((r["done"] for r in answered), default=start) - start
+
+    print(
+        f"{len(results)} requests at {args.rate:g}/s, {args.workers} workers, "
+        f"batch size {args.batch_size}, {'fakeredis' if not args.redis_url else args.redis_url}\n"
+    )
+    print(f"finished      {len(finished)}")
+    print(f"failed        {len(answered) - len(finished)}")
+    print(f"rejected      {len(results) - len(answered)}")
+    print(f"deduplicated  {sum(r['deduplicated'] for r in answered)}")
+    print(f"LLM calls     {llm.requests}")
+    print(f"jobs/s        {len(jobs) / elapsed if elapsed else 0:.1f}")
+    print(f"answers/s     {len(finished) / elapsed if elapsed else 0:.1f}\n")
+
+    print(f"{'ms':<14} {'p50':>8} {'p95':>8} {'p99':>8}")
+    print(f"{'end-to-end':<14} {percentiles([r['latency'] for r in finished])}")
+    print(f"{'queue wait':<14} {percentiles(queue_waits(list(jobs), dequeued_at))}")
+
+    print(f"\n{'stage':<16} {'mean ms':>8}")
+    for stage, mean in sorted(stage_means().items()):
+        print(f"{stage:<16} {mean * 1000:>8.1f}")
+
+
+# python -m bench.rag_queue_load --rate 50 --count 500 --workers 8
+if __name__ == "__main__":
+    main()
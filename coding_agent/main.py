@@ -1,34 +1,23 @@
-from openai.types.chat import ChatCompletionMessageParam
-from openai import OpenAI
+import asyncio
+from agents import Agent, Session, ShellSession
+from agents.engine import run_cli
 from dotenv import load_dotenv
-import os
-import json
-from pydantic import BaseModel, Field
-from typing import Optional
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set")
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "http://127.0.0.1",
-        "X-Title": "hello-world-test",
-    },
-)
+def coding_tools(session: Session) -> dict:
+    # One shell per session, so cd and exported variables carry over between
+    # commands. They run one after another, as each may build on the last.
+    shell = ShellSession()
+    session.on_close(shell.close)
 
+    def run_command(cmd: str) -> str:
+        """Runs a linux command in a shell that keeps its working directory and
+        variables between calls. Returns the exit code, stdout and stderr."""
+        return str(shell.run(cmd))
 
-def run_command(cmd: str):
-    exit_code = os.system(cmd)
-    print(f"Ran command: {cmd} with exit code {exit_code}")
-    return f"Ran command with exit code {exit_code}"
-
-
-available_tools = {"run_command": run_command}
+    return {"run_command": run_command}
 
 
 SYSTEM_PROMPT = """
@@ -51,7 +40,7 @@ Output JSON Format:
 No extra text, no prefixes, no explanation. Only valid JSON.
 
 Available Tools:
-- run_command(cmd: str) : Takes linux cmd as an input and run that command. 
+- run_command(cmd: str) : Takes linux cmd as an input and runs it in a shell that keeps its working directory and variables between calls. Returns the exit code, stdout and stderr.
 
 Example 1:
 
@@ -89,108 +78,9 @@ OUTPUT: { "step": "OUTPUT", "content": "Created a todo application using HTML, C
 """
 
 
-class ResponseFormat(BaseModel):
-    step: str = Field(
-        ..., description="The id of the step like START, PLAN, OUTPUT, TOOL, OBSERVE"
-    )
-    content: Optional[str] = Field(None, description="The optional string content")
-    tool: Optional[str] = Field(None, description="The id of the tool call")
-    input: Optional[str] = Field(None, description="The input parms for the tool")
-    output: Optional[str] = Field(None, description="The output of the tool call")
-
-
-message_history: list[ChatCompletionMessageParam] = [
-    {"role": "system", "content": SYSTEM_PROMPT},
-]
-
-user_query = input("> ")
-message_history.append({"role": "user", "content": user_query})
-
-VALID_STEPS = {"START", "PLAN", "OUTPUT", "TOOL", "OBSERVE"}
-
-max_steps = 30
-step_count = 0
-retry_limit = 5
-retry_count = 0
-
-while step_count < max_steps:
-    step_count += 1
-
-    response = client.chat.completions.parse(
-        model="openai/gpt-oss-120b:free",
-        messages=message_history,
-        response_format=ResponseFormat,
-    )
-
-    parsed_response = response.choices[0].message.parsed
-
-    if not parsed_response:
-        retry_count += 1
-        print("⚠️ Model returned no JSON — retrying...")
-
-        if retry_count >= retry_limit:
-            print("❌ Too many failures. Stopping.")
-            break
-
-        message_history.append(
-            {
-                "role": "system",
-                "content": "You FAILED. Output ONE valid JSON step only.",
-            }
-        )
-        continue
-
-    retry_count = 0
-
-    try:
-        step_type = parsed_response.step
-
-        if step_type not in VALID_STEPS:
-            print("⚠️ Skipping invalid step:")
-            print(step_type)
-            continue
-
-        message_history.append(
-            {"role": "assistant", "content": json.dumps(parsed_response.model_dump())}
-        )
-
-        if step_type == "START":
-            print(f"🔥 {parsed_response.content}")
-
-        elif step_type == "PLAN":
-            print(f"🧠 {parsed_response.content}")
-
-        elif step_type == "TOOL":
-            tool_to_call = parsed_response.tool
-            tool_input = parsed_response.input
-            if isinstance(tool_to_call, str) and isinstance(tool_input, str):
-                print(f"🛠️: {tool_to_call} {tool_input}")
-
-                tool_response = available_tools[tool_to_call](tool_input)
-
-                message_history.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_to_call,
-                        "content": json.dumps(
-                            {
-                                "step": "OBSERVE",
-                                "tool": tool_to_call,
-                                "input": tool_input,
-                                "output": tool_response,
-                            }
-                        ),
-                    }
-                )
-            else:
-                continue
-
-        elif step_type == "OUTPUT":
-            print(f"🤖 {parsed_response.content}")
-            exit()
-
-    except json.JSONDecodeError:
-        print("⚠️ Skipping malformed JSON:")
-        print(parsed_response)
-
-print("⚠️ Max steps reached — stopping.")
+agent = Agent(SYSTEM_PROMPT, model="openai/gpt-oss-120b:free", tools=coding_tools)
+
+
+# python -m coding_agent.main
+if __name__ == "__main__":
+    asyncio.run(run_cli(agent))
@@ -0,0 +1,3 @@
+from .client import get_async_client, get_client
+
+__all__ = ["get_client", "get_async_client"]
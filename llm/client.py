@@ -0,0 +1,262 @@
+import asyncio
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from functools import cache
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from .response_cache import (
+    CACHE_MODE,
+    AsyncCachingTransport,
+    CachingTransport,
+    ResponseCache,
+)
+
+PROVIDERS = {
+    "openrouter": {
+        "base_url": "https://openrouter.ai/api/v1",
+        "api_key_env": "OPENAI_API_KEY",
+        "default_headers": {
+            "HTTP-Referer": "http://127.0.0.1",
+            "X-Title": "hello-world-test",
+        },
+    },
+    "gemini": {
+        "base_url": "https://generativelanguage.googleapis.com/v1beta/openai/",
+        "api_key_env": "GEMINI_API_KEY",
+        "default_headers": {},
+    },
+}
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# One pool per provider and process, connections are reused across requests
+LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=60
+)
+TIMEOUT = httpx.Timeout(120, connect=10)
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and bursts of `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns the seconds to wait before using it.
+
+        Tokens may go negative, later callers then queue up behind earlier ones.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float):
+        """Holds back every request for `seconds` beyond the current queue."""
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+def backoff(attempt: int) -> float:
+    # Full jitter, so clients that failed together do not retry together
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Neither seconds nor an HTTP date, the usual backoff applies
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class Limiter:
+    """Token buckets per model of one provider and the retry policy for its responses."""
+
+    def __init__(self, requests_per_minute: float):
+        self.rate = requests_per_minute / 60
+        self.buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, request: httpx.Request) -> TokenBucket | None:
+        if not self.rate:
+            return None
+
+        # Requests without a JSON body share the default bucket
+        model = ""
+        content_type = request.headers.get("content-type", "")
+        if request.method == "POST" and content_type.startswith("application/json"):
+            try:
+                body = json.loads(request.content)
+            except ValueError:
+                body = None
+            if isinstance(body, dict):
+                model = body.get("model", "")
+        with self._lock:
+            if model not in self.buckets:
+                # Quotas are per minute, so a minute's worth may go out at once
+                self.buckets[model] = TokenBucket(self.rate, max(1.0, self.rate * 60))
+            return self.buckets[model]
+
+    def acquire(self, request: httpx.Request) -> float:
+        bucket = self._bucket(request)
+        return bucket.reserve() if bucket else 0.0
+
+    def retry_delay(
+        self, request: httpx.Request, response: httpx.Response, attempt: int
+    ) -> float | None:
+        """Seconds to wait before retrying, None when the response is final."""
+        if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            return None
+
+        delay = retry_after(response)
+        if delay is None:
+            delay = backoff(attempt)
+
+        bucket = self._bucket(request)
+        if response.status_code == 429 and bucket:
+            # The provider is over its limit for everyone using this model, so
+            # all queued requests wait, not only this one
+            bucket.pause(delay)
+            return 0.0
+        return delay
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    def __init__(self, limiter: Limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            time.sleep(self.limiter.acquire(request))
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError:
+                if attempt >= MAX_RETRIES:
+                    raise
+                time.sleep(backoff(attempt))
+                attempt += 1
+                continue
+
+            delay = self.limiter.retry_delay(request, response, attempt)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncRateLimitedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, limiter: Limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.acquire(request))
+            try:
+                response = await super().handle_async_request(request)
+            except httpx.TransportError:
+                if attempt >= MAX_RETRIES:
+                    raise
+                await asyncio.sleep(backoff(attempt))
+                attempt += 1
+                continue
+
+            delay = self.limiter.retry_delay(request, response, attempt)
+            if delay is None:
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _settings(provider: str) -> dict:
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {provider}")
+
+    config = PROVIDERS[provider]
+    api_key = os.getenv(config["api_key_env"])
+    # Replays never reach the provider, so they run without credentials
+    if not api_key and CACHE_MODE == "replay":
+        api_key = "replay"
+    if not api_key:
+        raise RuntimeError(f"{config['api_key_env']} not set")
+
+    prefix = provider.upper()
+    return {
+        "base_url": os.getenv(f"{prefix}_BASE_URL", config["base_url"]),
+        "api_key": api_key,
+        "default_headers": config["default_headers"],
+        # Retries are done by the transport, where they also respect the rate limit
+        "max_retries": 0,
+        "timeout": TIMEOUT,
+    }
+
+
+@cache
+def get_limiter(provider: str) -> Limiter:
+    # Off unless <PROVIDER>_REQUESTS_PER_MINUTE is set, e.g. to 20 for the free
+    # OpenRouter models. The limit applies per process, 429s are retried either way.
+    return Limiter(float(os.getenv(f"{provider.upper()}_REQUESTS_PER_MINUTE", "0")))
+
+
+@cache
+def get_response_cache() -> ResponseCache | None:
+    if CACHE_MODE not in ("off", "on", "replay"):
+        raise ValueError(f"LLM_CACHE must be off, on or replay, not {CACHE_MODE}")
+    return None if CACHE_MODE == "off" else ResponseCache()
+
+
+@cache
+def get_client(provider: str = "openrouter") -> OpenAI:
+    settings = _settings(provider)
+    transport = RateLimitedTransport(get_limiter(provider), limits=LIMITS)
+    # Cached responses skip the rate limit, they never reach the provider
+    if response_cache := get_response_cache():
+        transport = CachingTransport(
+            transport, response_cache, replay=CACHE_MODE == "replay"
+        )
+    return OpenAI(**settings, http_client=DefaultHttpxClient(transport=transport))
+
+
+@cache
+def get_async_client(provider: str = "openrouter") -> AsyncOpenAI:
+    settings = _settings(provider)
+    transport = AsyncRateLimitedTransport(get_limiter(provider), limits=LIMITS)
+    if response_cache := get_response_cache():
+        transport = AsyncCachingTransport(
+            transport, response_cache, replay=CACHE_MODE == "replay"
+        )
+    return AsyncOpenAI(
+        **settings, http_client=DefaultAsyncHttpxClient(transport=transport)
+    )
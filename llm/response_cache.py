@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from threading import Lock
+
+import httpx
+
+# off, on (serve recorded responses and record new ones) or replay (never send)
+CACHE_MODE = os.getenv("LLM_CACHE", "off")
+DEFAULT_CACHE_PATH = Path(
+    os.getenv("LLM_CACHE_PATH", Path(__file__).parent / ".response_cache.sqlite")
+)
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Seconds a recorded response is served for, 0 keeps them until evicted
+TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Enough to rebuild the body, connection level headers do not apply to a replay
+STORED_HEADERS = ("content-type", "content-encoding")
+
+
+def request_key(request: httpx.Request) -> str:
+    """Hash of what decides the answer: the endpoint path and the JSON body.
+
+    The body is canonicalized, so the key does not depend on argument order.
+    The host and headers such as the API key are left out, recordings replay
+    through a proxy or another base URL of the same API.
+    """
+    try:
+        body = json.dumps(json.loads(request.content), sort_keys=True)
+    except ValueError:
+        body = request.content.decode("utf-8", "replace")
+    return hashlib.sha256(
+        f"{request.method}\0{request.url.path}\0{body}".encode("utf-8")
+    ).hexdigest()
+
+
+class ResponseCache:
+    """Responses by request key in SQLite, shared by every process using the same file.
+
+    Entries older than `ttl` are not served. When the stored bodies exceed
+    `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        max_bytes: int = MAX_BYTES,
+        ttl: float = TTL,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._pid = None
+        self._db: sqlite3.Connection
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _connect(self):
+        # Connections are not fork safe, every process opens its own
+        if self._pid == os.getpid():
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, status INTEGER, "
+            "headers TEXT, body BLOB, size INTEGER, created REAL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS lru ON responses (last_used)")
+        self._db.commit()
+        self._pid = os.getpid()
+
+    def get(self, key: str, expire: bool = True) -> httpx.Response | None:
+        with self._lock:
+            self._connect()
+            row = self._db.execute(
+                "SELECT status, headers, body, created FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            now = time.time()
+            if row is None or (expire and self.ttl and row[3] < now - self.ttl):
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+
+        self.hits += 1
+        status, headers, body, _ = row
+        return httpx.Response(status, headers=json.loads(headers), content=body)
+
+    def put(self, key: str, response: httpx.Response, body: bytes):
+        headers = {
+            name: response.headers[name]
+            for name in STORED_HEADERS
+            if name in response.headers
+        }
+        with self._lock:
+            self._connect()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        response.status_code,
+                        json.dumps(headers),
+                        body,
+                        len(body),
+                        now,
+                        now,
+                    ),
+                )
+                self._evict(now)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def _evict(self, now: float):
+        if self.ttl:
+            self._db.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.ttl,)
+            )
+
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+
+class _Recorder:
+    def __init__(self, stream, cache: ResponseCache, key: str, response):
+        self.stream = stream
+        self.cache = cache
+        self.key = key
+        self.response = response
+        self.parts: list[bytes] = []
+        self.stored = False
+
+    def _complete_body(self, read_to_end: bool) -> bytes | None:
+        if self.stored:
+            return None
+        self.stored = True
+
+        body = b"".join(self.parts)
+        # Clients stop reading a stream at its [DONE] event, before the body ends
+        if read_to_end or body.rstrip().endswith(b"data: [DONE]"):
+            return body
+        return None
+
+    def _store(self, read_to_end: bool):
+        body = self._complete_body(read_to_end)
+        if body is not None:
+            self.cache.put(self.key, self.response, body)
+
+    async def _astore(self, read_to_end: bool):
+        body = self._complete_body(read_to_end)
+        if body is not None:
+            await asyncio.to_thread(self.cache.put, self.key, self.response, body)
+
+
+class RecordingStream(_Recorder, httpx.SyncByteStream):
+    """Passes the body through and stores it once it is complete, so streamed
+    completions still reach the caller token by token."""
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self.stream:
+            self.parts.append(part)
+            yield part
+        self._store(read_to_end=True)
+
+    def close(self):
+        self._store(read_to_end=False)
+        self.stream.close()
+
+
+class AsyncRecordingStream(_Recorder, httpx.AsyncByteStream):
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for part in self.stream:
+            self.parts.append(part)
+            yield part
+        await self._astore(read_to_end=True)
+
+    async def aclose(self):
+        await self._astore(read_to_end=False)
+        await self.stream.aclose()
+
+
+def _replay_miss(request: httpx.Request):
+    raise RuntimeError(
+        f"LLM_CACHE=replay and no recorded response for {request.method} {request.url}"
+    )
+
+
+class CachingTransport(httpx.BaseTransport):
+    """Serves POST requests from the cache before they reach `transport`."""
+
+    def __init__(
+        self, transport: httpx.BaseTransport, cache: ResponseCache, replay: bool
+    ):
+        self.transport = transport
+        self.cache = cache
+        self.replay = replay
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return self.transport.handle_request(request)
+
+        key = request_key(request)
+        cached = self.cache.get(key, expire=not self.replay)
+        if cached is not None:
+            return cached
+        if self.replay:
+            _replay_miss(request)
+
+        response = self.transport.handle_request(request)
+        if response.status_code != 200:
+            return response
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=RecordingStream(response.stream, self.cache, key, response),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, cache: ResponseCache, replay: bool
+    ):
+        self.transport = transport
+        self.cache = cache
+        self.replay = replay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return await self.transport.handle_async_request(request)
+
+        # A lookup writes its hit and waits for the lock while another process
+        # stores, which must not hold up the event loop
+        key = request_key(request)
+        cached = await asyncio.to_thread(self.cache.get, key, expire=not self.replay)
+        if cached is not None:
+            return cached
+        if self.replay:
+            _replay_miss(request)
+
+        response = await self.transport.handle_async_request(request)
+        if response.status_code != 200:
+            return response
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=AsyncRecordingStream(response.stream, self.cache, key, response),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -2,7 +2,7 @@ import json
 from mem0 import Memory
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+from llm import get_client
 
 load_dotenv()
 
@@ -22,10 +22,7 @@ neo_password = os.getenv("NEO_PASSWORD")
 if not neo_password:
     raise RuntimeError("NEO_PASSWORD not set")
 
-client = OpenAI(
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-    api_key=gemini_api_key,
-)
+client = get_client("gemini")
 
 config = {
     "version": "v1.1",
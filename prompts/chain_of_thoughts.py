@@ -1,24 +1,10 @@
-import re
-from openai import OpenAI
+import asyncio
+from agents import Agent
+from agents.engine import run_cli
 from dotenv import load_dotenv
-import os
-import json
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set")
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "http://127.0.0.1",
-        "X-Title": "hello-world-test",
-    },
-)
-
 # Chain of thought prompts are the type of prompts which uses multiple steps to respond to a problem query.
 SYSTEM_PROMPT = """
 You're an expert AI Assistant in resolving user queries using chain of thought.
@@ -53,97 +39,15 @@ PLAN: { "step": "PLAN", "content": "Great, we have solved and finally left with
 
 OUTPUT: { "step": "OUTPUT", "content": "3.5" }"""
 
-message_history = [
-    {"role": "system", "content": SYSTEM_PROMPT},
-]
-
-user_query = input("> ")
-message_history.append({"role": "user", "content": user_query})
-
-
-def extract_json_objects(text):
-    objects = []
-    stack = []
-    start = None
-
-    for i, char in enumerate(text):
-        if char == "{":
-            if not stack:
-                start = i
-            stack.append("{")
-        elif char == "}":
-            if stack:
-                stack.pop()
-                if not stack and start is not None:
-                    objects.append(text[start : i + 1])
-                    start = None
-    return objects
-
-
-VALID_STEPS = {"START", "PLAN", "OUTPUT"}
-
-max_steps = 30
-step_count = 0
-retry_limit = 5
-retry_count = 0
-
-while step_count < max_steps:
-    step_count += 1
-
-    response = client.chat.completions.create(
-        model="deepseek/deepseek-r1-0528:free",
-        messages=message_history,
-    )
-
-    raw_response = response.choices[0].message.content.strip()
-
-    raw_response = re.sub(r"<think>.*?</think>", "", raw_response, flags=re.S).strip()
-
-    json_objects = extract_json_objects(raw_response)
-
-    if not json_objects:
-        retry_count += 1
-        print("⚠️ Model returned no JSON — retrying...")
-
-        if retry_count >= retry_limit:
-            print("❌ Too many failures. Stopping.")
-            break
-
-        message_history.append(
-            {
-                "role": "system",
-                "content": "You FAILED. Output ONE valid JSON step only.",
-            }
-        )
-        continue
-
-    retry_count = 0
-
-    for obj in json_objects:
-        try:
-            parsed = json.loads(obj)
-            step_type = parsed.get("step")
-            content = parsed.get("content", "")
-
-            if step_type not in VALID_STEPS:
-                print("⚠️ Skipping invalid step:")
-                print(obj)
-                continue
-
-            message_history.append({"role": "assistant", "content": obj})
-
-            if step_type == "START":
-                print(f"🔥 {content}")
-
-            elif step_type == "PLAN":
-                print(f"🧠 {content}")
-
-            elif step_type == "OUTPUT":
-                print(f"🤖 {content}")
-                exit()
+# The model thinks out loud before its JSON, the steps are taken out of the text
+agent = Agent(
+    SYSTEM_PROMPT,
+    model="deepseek/deepseek-r1-0528:free",
+    structured=False,
+    valid_steps={"START", "PLAN", "OUTPUT"},
+)
 
-        except json.JSONDecodeError:
-            print("⚠️ Skipping malformed JSON:")
-            print(obj)
 
-print("⚠️ Max steps reached — stopping.")
+# python -m prompts.chain_of_thoughts
+if __name__ == "__main__":
+    asyncio.run(run_cli(agent))
@@ -1,22 +1,9 @@
-from openai import OpenAI
+from llm import get_client
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set")
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "http://127.0.0.1",
-        "X-Title": "hello-world-test",
-    },
-)
+client = get_client("openrouter")
 
 # Few-Shot prompts are the prompts that are directly given to model with a few examples so the responses should follow the pattern.
 SYSTEM_PROMPT = """You are an ai model developed by Vinit Kashwan. You are an expert in maths and only allowed to answer questions related to maths only. All the answers should be short means you should give the final answer in the response instead of explanations or intermediary steps.
@@ -0,0 +1,118 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_BM25_INDEX = Path(__file__).parent / "bm25_index"
+
+# Keeps identifiers such as binary_search or O(n) parts intact as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Builder:
+    def __init__(self):
+        self.vocab: dict[str, int] = {}
+        self.postings: list[list[tuple[int, int]]] = []
+        self.doc_ids: list[str] = []
+        self.doc_lengths: list[int] = []
+
+    def add(self, doc_ids: list[str], texts: list[str]):
+        for doc_id, text in zip(doc_ids, texts):
+            row = len(self.doc_ids)
+            tokens = tokenize(text)
+            self.doc_ids.append(doc_id)
+            self.doc_lengths.append(len(tokens))
+
+            for term, tf in Counter(tokens).items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                if term_id == len(self.postings):
+                    self.postings.append([])
+                self.postings[term_id].append((row, tf))
+
+    def save(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        path.mkdir(parents=True, exist_ok=True)
+
+        # CSR layout, the postings of term t are rows[term_offsets[t]:term_offsets[t + 1]]
+        term_offsets = np.zeros(len(self.postings) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in self.postings], out=term_offsets[1:])
+        rows = np.fromiter(
+            (row for p in self.postings for row, _ in p),
+            dtype=np.int32,
+            count=term_offsets[-1],
+        )
+        tfs = np.fromiter(
+            (tf for p in self.postings for _, tf in p),
+            dtype=np.float32,
+            count=term_offsets[-1],
+        )
+
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Length normalization of every document, precomputed for the scoring loop
+        norms = k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-6))
+
+        np.save(path / "term_offsets.npy", term_offsets)
+        np.save(path / "rows.npy", rows)
+        np.save(path / "tfs.npy", tfs)
+        np.save(path / "norms.npy", norms.astype(np.float32))
+        (path / "vocab.json").write_text(json.dumps(list(self.vocab)))
+        (path / "ids.json").write_text(json.dumps(self.doc_ids))
+        (path / "meta.json").write_text(
+            json.dumps({"k1": k1, "b": b, "count": len(self.doc_ids)})
+        )
+
+
+class BM25Index:
+    def __init__(self, path: Path = DEFAULT_BM25_INDEX):
+        meta = json.loads((path / "meta.json").read_text())
+        self.k1 = meta["k1"]
+        self.count = meta["count"]
+
+        self.term_offsets = np.load(path / "term_offsets.npy", mmap_mode="r")
+        self.rows = np.load(path / "rows.npy", mmap_mode="r")
+        self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+        self.norms = np.load(path / "norms.npy")
+        self.vocab = {
+            term: term_id
+            for term_id, term in enumerate(
+                json.loads((path / "vocab.json").read_text())
+            )
+        }
+        self.doc_ids = json.loads((path / "ids.json").read_text())
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        rows, weights = [], []
+
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            df = end - start
+            idf = np.log1p((self.count - df + 0.5) / (df + 0.5))
+            term_rows = self.rows[start:end]
+            tfs = self.tfs[start:end]
+
+            rows.append(term_rows)
+            weights.append(idf * tfs * (self.k1 + 1) / (tfs + self.norms[term_rows]))
+
+        if not rows:
+            return []
+
+        scores = np.bincount(
+            np.concatenate(rows), weights=np.concatenate(weights), minlength=self.count
+        )
+        k = min(k, np.count_nonzero(scores))
+        if not k:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        return [(self.doc_ids[row], float(scores[row])) for row in best]
@@ -1,46 +1,30 @@
 from openai.types.chat import ChatCompletionMessageParam
-from openai import OpenAI
+from llm import get_client
 from dotenv import load_dotenv
-import os
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from .context import CONTEXT_CANDIDATES, build_context
+from .embedding_cache import CachedEmbeddings
+from .vector_store import open_vector_store, search_params
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set")
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "http://127.0.0.1",
-        "X-Title": "hello-world-test",
-    },
-)
+client = get_client("openrouter")
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+embedding_model = CachedEmbeddings(
+    HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 )
 
-vector_db = QdrantVectorStore.from_existing_collection(
-    url="http://localhost:6333",
-    collection_name="learning_rag",
-    embedding=embedding_model,
-)
+vector_db = open_vector_store(embedding_model)
 
+# python -m rag.chat to ask questions about the indexed documents
 user_query = input("Ask something: ")
 
-search_result = vector_db.similarity_search(query=user_query, k=3)
-
-context = "\n\n\n".join(
-    [
-        f"Page Content: {result.page_content}\nPage Number: {result.metadata['page_label']}\nFile Location: {result.metadata['source']}"
-        for result in search_result
-    ]
+search_result = vector_db.similarity_search(
+    query=user_query, k=CONTEXT_CANDIDATES, search_params=search_params()
 )
 
+context = build_context(search_result)
+
 SYSTEM_PROMPT = f"""
 You are a helpfull AI assistant who answers user queries based on the available context returived from a PDF file along with page_contents and page number.
 
@@ -0,0 +1,120 @@
+import os
+from functools import cache
+
+import tiktoken
+from langchain_core.documents import Document
+
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1000"))
+# Chunks fetched per query, they are packed into the budget in rank order
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+# Shorter common text between two chunks is treated as a coincidence
+MIN_OVERLAP = 20
+# A chunk cut down to fewer tokens than this is left out instead
+MIN_TRIMMED_TOKENS = 50
+
+
+@cache
+def get_encoder() -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+
+def overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that `right` starts with."""
+    if len(right) < MIN_OVERLAP:
+        return 0
+
+    # Only positions where the start of `right` occurs can begin the overlap
+    probe = right[:MIN_OVERLAP]
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+class Passage:
+    """Chunks of one page, with the text they repeat from each other removed."""
+
+    def __init__(self, document: Document):
+        self.source = document.metadata.get("source")
+        self.page_label = document.metadata.get("page_label")
+        self.chunks = [document]
+
+    def key(self) -> tuple:
+        return self.source, self.page_label
+
+    def text(self, chunks: list[Document] | None = None) -> str:
+        chunks = sorted(
+            chunks or self.chunks, key=lambda c: c.metadata.get("chunk_index", 0)
+        )
+        text = chunks[0].page_content
+        for chunk in chunks[1:]:
+            shared = overlap(text, chunk.page_content)
+            # Chunks that are not neighbours are kept apart
+            text += (
+                chunk.page_content[shared:]
+                if shared
+                else "\n...\n" + chunk.page_content
+            )
+        return text
+
+    def format(self, text: str) -> str:
+        return f"Page Content: {text}\nPage Number: {self.page_label}\nFile Location: {self.source}"
+
+
+def build_context(documents: list[Document], budget: int = CONTEXT_TOKENS) -> str:
+    """Packs ranked chunks into at most `budget` tokens of context.
+
+    Chunks of the same page are merged, so the overlap the splitter gives
+    neighbouring chunks is sent once. Chunks are taken in rank order while
+    they fit, the first one that does not is trimmed to the remaining budget.
+    """
+    passages: dict[tuple, Passage] = {}
+    texts: dict[tuple, str] = {}
+    tokens: dict[tuple, int] = {}
+    seen = set()
+
+    for document in documents:
+        content_key = (
+            document.metadata.get("source"),
+            document.metadata.get("page_label"),
+            document.page_content,
+        )
+        if content_key in seen:
+            continue
+        seen.add(content_key)
+
+        candidate = Passage(document)
+        key = candidate.key()
+        passage = passages.get(key)
+        chunks = passage.chunks + [document] if passage else [document]
+        text = (passage or candidate).text(chunks)
+        used = sum(tokens.values()) - tokens.get(key, 0)
+        needed = count_tokens((passage or candidate).format(text)) + 2
+
+        if used + needed <= budget:
+            if passage:
+                passage.chunks.append(document)
+            else:
+                passages[key] = candidate
+            texts[key], tokens[key] = text, needed
+            continue
+
+        # Only a new passage is trimmed, cutting a merged one could drop text
+        # that is already in the context
+        remaining = budget - used - count_tokens(candidate.format("")) - 2
+        if passage is None and remaining >= MIN_TRIMMED_TOKENS:
+            encoder = get_encoder()
+            text = encoder.decode(
+                encoder.encode(document.page_content, disallowed_special=())[:remaining]
+            )
+            passages[key] = candidate
+            texts[key], tokens[key] = text, budget - used
+        break
+
+    return "\n\n\n".join(passages[key].format(texts[key]) for key in passages)
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = Path(
+    os.getenv("EMBEDDING_CACHE_DIR", Path(__file__).parent / ".embedding_cache")
+)
+# A hit only rewrites its last_used when it is older than this, so most reads write nothing
+TOUCH_INTERVAL = 60.0
+
+
+class CachedEmbeddings(Embeddings):
+    """Content addressed embedding cache shared by every process using the same directory.
+
+    Keys live in SQLite, vectors in a float32 memory mapped file with one slot per key.
+    When all slots are used the least recently used keys give up their slots.
+    Readers take no lock, a row whose checksum does not match what SQLite has
+    for its key was overwritten by a writer meanwhile and counts as a miss.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str | None = None,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        capacity: int = 200_000,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model_name", "default")
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._pid = None
+        self._db: sqlite3.Connection
+        self._vectors: np.memmap | None = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "document").tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], "query")[0].tolist()
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "query").tolist()
+
+    def _key(self, text: str, kind: str) -> str:
+        # Query and document encodings differ for some models, so they never share a key
+        return hashlib.sha256(
+            f"{self.model_name}\0{kind}\0{text}".encode("utf-8")
+        ).hexdigest()
+
+    def _connect(self):
+        # Connections and mappings are not fork safe, every process opens its own
+        if self._pid == os.getpid():
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(
+            self.cache_dir / "index.sqlite", timeout=30, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(entries)")]
+        if columns and "checksum" not in columns:
+            # Entries from before checksums can't be verified, the cache starts over
+            self._db.execute("DROP TABLE entries")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, slot INTEGER, last_used REAL, checksum INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS lru ON entries (last_used)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self._db.commit()
+        self._vectors = None
+        self._pid = os.getpid()
+
+    def _open_vectors(self, dim: int | None) -> np.memmap | None:
+        if self._vectors is not None:
+            return self._vectors
+
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (dim,))
+            self._db.commit()
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE name = 'dim'"
+            ).fetchone()
+
+        dim = row[0]
+        path = self.cache_dir / "vectors.f32"
+        if not path.exists():
+            # Sparse file, disk is only used for slots that get written
+            with open(path, "wb") as f:
+                f.truncate(self.capacity * dim * 4)
+
+        # The file that already exists decides the capacity for every process
+        self.capacity = path.stat().st_size // (dim * 4)
+        self._vectors = np.memmap(
+            path, dtype=np.float32, mode="r+", shape=(self.capacity, dim)
+        )
+        return self._vectors
+
+    def _lookup(self, keys: list[str]) -> dict[str, tuple[int, int, float]]:
+        """(slot, checksum, last_used) of the keys that are cached."""
+        entries = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, *entry in self._db.execute(
+                f"SELECT key, slot, checksum, last_used FROM entries WHERE key IN ({placeholders})",
+                batch,
+            ):
+                entries[key] = tuple(entry)
+        return entries
+
+    def _allocate(self, count: int) -> list[int]:
+        # Slots 0..used-1 are always taken, eviction hands over the slots it frees
+        used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        slots = list(range(used, min(used + count, self.capacity)))
+
+        if len(slots) < count:
+            evicted = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                (count - len(slots),),
+            ).fetchall()
+            self._db.executemany(
+                "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted]
+            )
+            slots.extend(slot for _, slot in evicted)
+
+        return slots
+
+    def _embed(self, texts: list[str], kind: str) -> np.ndarray:
+        keys = [self._key(text, kind) for text in texts]
+
+        with self._lock:
+            self._connect()
+            vectors = self._open_vectors(None)
+            if not texts:
+                return np.empty(
+                    (0, vectors.shape[1] if vectors is not None else 0), np.float32
+                )
+
+            result: list[np.ndarray | None] = [None] * len(texts)
+            # A deferred transaction reads one snapshot without the write lock
+            self._db.execute("BEGIN")
+            try:
+                entries = self._lookup(keys) if vectors is not None else {}
+            finally:
+                self._db.commit()
+
+            now = time.time()
+            touched = set()
+            for i, key in enumerate(keys):
+                if key not in entries:
+                    continue
+                slot, checksum, last_used = entries[key]
+                row = np.array(vectors[slot])
+                # The slot may have been evicted and rewritten since the snapshot
+                if zlib.crc32(row.tobytes()) != checksum:
+                    continue
+                result[i] = row
+                if last_used < now - TOUCH_INTERVAL:
+                    touched.add(key)
+
+            if touched:
+                self._db.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in touched],
+                )
+                self._db.commit()
+
+        missing = {
+            key: text
+            for key, text, vector in zip(keys, texts, result)
+            if vector is None
+        }
+        self.hits += len(texts) - sum(vector is None for vector in result)
+        self.misses += len(missing)
+
+        if missing:
+            # Queries are encoded in one batch unless the model has query specific options
+            if kind == "query" and getattr(
+                self.embeddings, "query_encode_kwargs", None
+            ):
+                computed = [
+                    self.embeddings.embed_query(text) for text in missing.values()
+                ]
+            else:
+                computed = self.embeddings.embed_documents(list(missing.values()))
+            computed = np.asarray(computed, dtype=np.float32)
+            by_key = dict(zip(missing, computed))
+
+            for i, key in enumerate(keys):
+                if result[i] is None:
+                    result[i] = by_key[key]
+
+            self._store(by_key)
+
+        return np.stack(result)
+
+    def _store(self, by_key: dict[str, np.ndarray]):
+        with self._lock:
+            self._connect()
+            vectors = self._open_vectors(len(next(iter(by_key.values()))))
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have stored some of these keys meanwhile
+                existing = self._lookup(list(by_key))
+                new_keys = [key for key in by_key if key not in existing]
+                slots = self._allocate(len(new_keys))
+
+                for key, slot in zip(new_keys, slots):
+                    vectors[slot] = by_key[key]
+                vectors.flush()
+
+                now = time.time()
+                self._db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                    [
+                        (key, slot, now, zlib.crc32(np.array(vectors[slot]).tobytes()))
+                        for key, slot in zip(new_keys, slots)
+                    ],
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
@@ -0,0 +1,56 @@
+from langchain_core.documents import Document
+
+from .bm25 import BM25Index
+
+
+class HybridRetriever:
+    """Fuses dense results of a vector store with BM25 keyword results using reciprocal rank fusion."""
+
+    def __init__(
+        self,
+        vector_store,
+        bm25: BM25Index,
+        candidates: int = 20,
+        rrf_k: int = 60,
+    ):
+        self.vector_store = vector_store
+        self.bm25 = bm25
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        dense = self.vector_store.similarity_search(
+            query, k=max(k, self.candidates), **kwargs
+        )
+        return self._fuse(query, dense, k)
+
+    def batch_similarity_search_by_vector(
+        self, queries: list[str], embeddings: list[list[float]], k: int = 4, **kwargs
+    ) -> list[list[Document]]:
+        from .vector_store import batch_search
+
+        dense = batch_search(
+            self.vector_store, queries, embeddings, max(k, self.candidates), **kwargs
+        )
+        return [self._fuse(query, docs, k) for query, docs in zip(queries, dense)]
+
+    def _fuse(self, query: str, dense: list[Document], k: int) -> list[Document]:
+        sparse = self.bm25.search(query, k=max(k, self.candidates))
+
+        scores: dict[str, float] = {}
+        for rank, document in enumerate(dense):
+            point_id = str(document.metadata["_id"])
+            scores[point_id] = scores.get(point_id, 0.0) + 1 / (self.rrf_k + rank + 1)
+        for rank, (point_id, _) in enumerate(sparse):
+            scores[point_id] = scores.get(point_id, 0.0) + 1 / (self.rrf_k + rank + 1)
+
+        best = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+
+        # Keyword-only hits are not in the dense results and get fetched by id
+        documents = {str(document.metadata["_id"]): document for document in dense}
+        missing = [point_id for point_id in best if point_id not in documents]
+        if missing:
+            for document in self.vector_store.get_by_ids(missing):
+                documents[str(document.metadata["_id"])] = document
+
+        return [documents[point_id] for point_id in best if point_id in documents]
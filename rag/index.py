@@ -1,30 +1,187 @@
+import argparse
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_qdrant import QdrantVectorStore
+from qdrant_client import models
+from .bm25 import DEFAULT_BM25_INDEX, BM25Builder
+from .embedding_cache import CachedEmbeddings
+from .ingest import find_pdfs, ingest
+from .manifest import IndexManifest, chunk_id
+from .numpy_store import QUANTIZATIONS, NumpyIndexWriter
+from .vector_store import DEFAULT_NUMPY_INDEX
 
-pdf_path = Path(__file__).parent / "dsa.pdf"
+parser = argparse.ArgumentParser(description="Index PDF files for retrieval")
+parser.add_argument(
+    "paths",
+    nargs="*",
+    type=Path,
+    default=[Path(__file__).parent / "dsa.pdf"],
+    help="PDF files or directories of PDF files",
+)
+parser.add_argument(
+    "--workers", type=int, default=None, help="Processes used to extract pages"
+)
+parser.add_argument(
+    "--batch-size", type=int, default=256, help="Chunks embedded per upsert"
+)
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="Only upsert chunks whose content changed since the last run and delete the "
+    "chunks of files that are no longer among the given paths",
+)
+parser.add_argument(
+    "--manifest",
+    type=Path,
+    default=Path(__file__).parent / "index_manifest.json",
+    help="Chunk hashes of the indexed corpus, with --incremental the given paths are "
+    "treated as the whole corpus",
+)
+parser.add_argument(
+    "--backend",
+    choices=["qdrant", "numpy"],
+    default="qdrant",
+    help="Upsert into the Qdrant server or write an index file for the in-process store",
+)
+parser.add_argument(
+    "--numpy-index",
+    type=Path,
+    default=DEFAULT_NUMPY_INDEX,
+    help="Directory the numpy index is written to",
+)
+parser.add_argument(
+    "--dtype",
+    choices=["float32", "float16"],
+    default="float32",
+    help="Storage type of the vectors in the numpy index",
+)
+parser.add_argument(
+    "--quantization",
+    choices=QUANTIZATIONS,
+    default="none",
+    help="Keep int8 or binary codes in RAM for the first search pass, full vectors on disk",
+)
+parser.add_argument(
+    "--bm25-index",
+    type=Path,
+    default=DEFAULT_BM25_INDEX,
+    help="Directory of the keyword index used for hybrid search",
+)
 
-loader = PyPDFLoader(file_path=pdf_path)
-docs = loader.load()
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=400,
-)
+def quantization_config(quantization: str):
+    if quantization == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
 
-chunks = text_splitter.split_documents(documents=docs)
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+def index_qdrant(args, pdf_paths, embedding_model) -> str:
+    vector_store = QdrantVectorStore.construct_instance(
+        embedding=embedding_model,
+        client_options={"url": "http://localhost:6333"},
+        collection_name="learning_rag",
+        # Only applies when the collection gets created
+        vector_params={"on_disk": args.quantization != "none"},
+        collection_create_options={
+            "quantization_config": quantization_config(args.quantization)
+        },
+    )
+
+    manifest = IndexManifest(args.manifest)
+    changed_files, file_hashes = manifest.changed_files(pdf_paths)
+    to_index = changed_files if args.incremental else pdf_paths
+
+    print(f"Reading {len(to_index)} of {len(pdf_paths)} files")
+    bm25 = BM25Builder()
+
+    def upsert(chunks):
+        changed, ids = manifest.diff(chunks, force=not args.incremental)
+        if changed:
+            vector_store.add_documents(changed, ids=ids, batch_size=len(changed))
+        print(f"Upserted {len(changed)} of {len(chunks)} chunks")
+
+    total = ingest(to_index, upsert, batch_size=args.batch_size, workers=args.workers)
+
+    # Without --incremental the paths are added to the corpus, files indexed
+    # by earlier runs stay
+    stale_ids = manifest.remove_stale(to_index, file_hashes, prune=args.incremental)
+    if stale_ids:
+        vector_store.delete(stale_ids)
+    manifest.save()
+
+    # Chunks of other runs were not read now, so the keyword index is rebuilt from the collection
+    scroll_bm25(vector_store, bm25)
+    bm25.save(args.bm25_index)
+
+    return f"{total} chunks read, {len(stale_ids)} removed"
+
+
+def scroll_bm25(vector_store: QdrantVectorStore, bm25: BM25Builder):
+    offset = None
+    while True:
+        points, offset = vector_store.client.scroll(
+            collection_name=vector_store.collection_name,
+            limit=1024,
+            offset=offset,
+            with_payload=[vector_store.content_payload_key],
+            with_vectors=False,
+        )
+        bm25.add(
+            [str(point.id) for point in points],
+            [point.payload[vector_store.content_payload_key] for point in points],
+        )
+        if offset is None:
+            break
+
+
+def index_numpy(args, pdf_paths, embedding_model) -> str:
+    writer = NumpyIndexWriter(
+        args.numpy_index, dtype=args.dtype, quantization=args.quantization
+    )
+    bm25 = BM25Builder()
+
+    def write(chunks):
+        ids = [chunk_id(c) for c in chunks]
+        texts = [c.page_content for c in chunks]
+        writer.add(chunks, embedding_model.embed_documents(texts), ids)
+        bm25.add(ids, texts)
+        print(f"Wrote {len(chunks)} chunks")
+
+    total = ingest(pdf_paths, write, batch_size=args.batch_size, workers=args.workers)
+    writer.close()
+    bm25.save(args.bm25_index)
+
+    return f"{total} chunks written to {args.numpy_index}"
+
+
+def main():
+    args = parser.parse_args()
+    if args.incremental and args.backend == "numpy":
+        parser.error("--incremental is only supported by the qdrant backend")
+
+    pdf_paths = find_pdfs(args.paths)
+
+    embedding_model = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    )
+
+    if args.backend == "numpy":
+        summary = index_numpy(args, pdf_paths, embedding_model)
+    else:
+        summary = index_qdrant(args, pdf_paths, embedding_model)
+
+    print(f"Indexing of documents done ({summary})")
+    print(f"Embedding cache: {embedding_model.stats()}")
 
-vector_store = QdrantVectorStore.from_documents(
-    documents=chunks,
-    embedding=embedding_model,
-    url="http://localhost:6333",
-    collection_name="learning_rag",
-)
 
-print("Indexing of documents done")
+# python -m rag.index [paths...] to index the documents
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+from typing import Callable, Iterable, Iterator
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 400
+PAGES_PER_TASK = 16
+
+_DONE = object()
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+)
+
+
+def find_pdfs(paths: Iterable[Path]) -> list[Path]:
+    pdfs = []
+    for path in paths:
+        # Sources and chunk ids are keyed by path, ./a.pdf and a.pdf are one file
+        path = path.resolve()
+        if path.is_dir():
+            pdfs.extend(sorted(path.rglob("*.pdf")))
+        else:
+            pdfs.append(path)
+    return pdfs
+
+
+def _page_tasks(pdf_paths: list[Path], pages_per_task: int):
+    for pdf_path in pdf_paths:
+        total_pages = len(PdfReader(pdf_path).pages)
+        for start in range(0, total_pages, pages_per_task):
+            yield pdf_path, start, min(start + pages_per_task, total_pages)
+
+
+def load_and_split(pdf_path: Path, start: int, end: int) -> list[Document]:
+    # Runs inside a pool process, each task only ever holds `end - start` pages
+    reader = PdfReader(pdf_path)
+    page_labels = reader.page_labels
+    total_pages = len(reader.pages)
+
+    pages = [
+        Document(
+            page_content=reader.pages[page].extract_text(),
+            metadata={
+                "source": str(pdf_path),
+                "page": page,
+                "page_label": page_labels[page],
+                "total_pages": total_pages,
+            },
+        )
+        for page in range(start, end)
+    ]
+
+    chunks = text_splitter.split_documents(pages)
+
+    # Position of the chunk within its page, used to derive stable chunk ids
+    chunk_index = 0
+    for previous, chunk in zip([None, *chunks], chunks):
+        if previous is not None and previous.metadata["page"] == chunk.metadata["page"]:
+            chunk_index += 1
+        else:
+            chunk_index = 0
+        chunk.metadata["chunk_index"] = chunk_index
+
+    return chunks
+
+
+def iter_chunks(
+    pdf_paths: list[Path],
+    workers: int | None = None,
+    pages_per_task: int = PAGES_PER_TASK,
+) -> Iterator[list[Document]]:
+    workers = workers or os.cpu_count() or 1
+    # Only a bounded number of page ranges are in flight, so memory does not grow with the PDF size
+    max_in_flight = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in _page_tasks(pdf_paths, pages_per_task):
+            pending.append(pool.submit(load_and_split, *task))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def ingest(
+    pdf_paths: list[Path],
+    on_batch: Callable[[list[Document]], None],
+    batch_size: int = 256,
+    workers: int | None = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    queue_size: int = 8,
+) -> int:
+    chunk_queue: Queue = Queue(maxsize=queue_size)
+
+    def produce():
+        try:
+            for chunks in iter_chunks(pdf_paths, workers, pages_per_task):
+                chunk_queue.put(chunks)
+        except BaseException as error:
+            chunk_queue.put(error)
+        finally:
+            chunk_queue.put(_DONE)
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+
+    total = 0
+    batch: list[Document] = []
+
+    while (item := chunk_queue.get()) is not _DONE:
+        if isinstance(item, BaseException):
+            raise item
+
+        batch.extend(item)
+        while len(batch) >= batch_size:
+            on_batch(batch[:batch_size])
+            total += batch_size
+            batch = batch[batch_size:]
+
+    if batch:
+        on_batch(batch)
+        total += len(batch)
+
+    producer.join()
+    return total
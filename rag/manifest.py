@@ -0,0 +1,94 @@
+import hashlib
+import json
+import uuid
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(chunk: Document) -> str:
+    metadata = chunk.metadata
+    key = f"{metadata['source']}#{metadata['page']}#{metadata['chunk_index']}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def chunk_hash(chunk: Document) -> str:
+    return hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    """Per-file and per-chunk content hashes of what is stored in the collection."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: dict[str, str] = {}
+        self.chunks: dict[str, dict] = {}
+
+        if path.exists():
+            data = json.loads(path.read_text())
+            self.files = data["files"]
+            self.chunks = data["chunks"]
+
+        self._seen: set[str] = set()
+
+    def changed_files(self, pdf_paths: list[Path]) -> tuple[list[Path], dict[str, str]]:
+        hashes = {str(path): file_hash(path) for path in pdf_paths}
+        changed = [
+            path for path in pdf_paths if self.files.get(str(path)) != hashes[str(path)]
+        ]
+        return changed, hashes
+
+    def diff(
+        self, chunks: list[Document], force: bool = False
+    ) -> tuple[list[Document], list[str]]:
+        changed, ids = [], []
+
+        for chunk in chunks:
+            point_id = chunk_id(chunk)
+            content_hash = chunk_hash(chunk)
+            self._seen.add(point_id)
+
+            if not force and self.chunks.get(point_id, {}).get("hash") == content_hash:
+                continue
+
+            self.chunks[point_id] = {
+                "hash": content_hash,
+                "source": chunk.metadata["source"],
+                "page_label": chunk.metadata["page_label"],
+            }
+            changed.append(chunk)
+            ids.append(point_id)
+
+        return changed, ids
+
+    def remove_stale(
+        self, reindexed: list[Path], hashes: dict[str, str], prune: bool = False
+    ) -> list[str]:
+        """Chunks of re-read files that were not produced again and, with `prune`,
+        chunks of files missing from `hashes`, which is then the whole corpus."""
+        reindexed_sources = {str(path) for path in reindexed}
+        stale = [
+            point_id
+            for point_id, entry in self.chunks.items()
+            if (prune and entry["source"] not in hashes)
+            or (entry["source"] in reindexed_sources and point_id not in self._seen)
+        ]
+
+        for point_id in stale:
+            del self.chunks[point_id]
+
+        self.files = hashes if prune else {**self.files, **hashes}
+        return stale
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"files": self.files, "chunks": self.chunks}))
+        tmp_path.replace(self.path)
@@ -0,0 +1,380 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Below this many vectors a full scan is faster than probing an IVF index
+IVF_THRESHOLD = 50_000
+SCAN_BLOCK = 16_384
+QUANTIZATIONS = ("none", "int8", "binary")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(sample: np.ndarray, nlist: int, iterations: int = 10) -> np.ndarray:
+    # Spherical k-means, the vectors are normalized so dot product is cosine similarity
+    rng = np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = sample[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+
+    return centroids.astype(np.float32)
+
+
+def int8_scale(vectors: np.ndarray) -> np.ndarray:
+    # Per dimension range, clipping the most extreme 0.1% of values
+    return np.maximum(np.quantile(np.abs(vectors), 0.999, axis=0), 1e-6).astype(
+        np.float32
+    )
+
+
+def quantize(vectors: np.ndarray, mode: str, scale: np.ndarray | None = None):
+    if mode == "int8":
+        return np.clip(np.rint(vectors / scale * 127), -127, 127).astype(np.int8)
+    return np.packbits(vectors > 0, axis=1)
+
+
+def approximate_scores(
+    codes: np.ndarray, query: np.ndarray, mode: str, scale: np.ndarray | None = None
+) -> np.ndarray:
+    if mode == "int8":
+        return codes.astype(np.float32) @ (query * scale / 127)
+
+    # Fewer differing sign bits means a higher similarity
+    query_bits = np.packbits(query > 0)
+    return (
+        -np.bitwise_count(codes ^ query_bits)
+        .sum(axis=1, dtype=np.int32)
+        .astype(np.float32)
+    )
+
+
+class NumpyIndexWriter:
+    """Appends normalized vectors and documents to an index directory read by NumpyVectorStore.
+
+    The index is built in a directory next to `target` and swapped in by
+    `close`, processes serving the old index keep their mapped files.
+    """
+
+    def __init__(self, path: Path, dtype: str = "float32", quantization: str = "none"):
+        self.target = path
+        self.path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.dtype = np.dtype(dtype)
+        self.quantization = quantization
+        self.dim: int | None = None
+        self.count = 0
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True)
+        self._vectors = open(self.path / "vectors.bin", "wb")
+        self._docs = open(self.path / "docs.jsonl", "wb")
+        self._offsets = [0]
+
+    def add(self, chunks: list[Document], vectors: list[list[float]], ids: list[str]):
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.dim = matrix.shape[1]
+        self._vectors.write(matrix.astype(self.dtype).tobytes())
+
+        for chunk, point_id in zip(chunks, ids):
+            line = json.dumps(
+                {
+                    "id": point_id,
+                    "page_content": chunk.page_content,
+                    "metadata": chunk.metadata,
+                }
+            ).encode("utf-8")
+            self._docs.write(line + b"\n")
+            self._offsets.append(self._offsets[-1] + len(line) + 1)
+
+        self.count += len(chunks)
+
+    def close(self, ivf_threshold: int = IVF_THRESHOLD):
+        self._vectors.close()
+        self._docs.close()
+        if not self.count:
+            shutil.rmtree(self.path)
+            raise ValueError(f"No chunks were added, {self.target} is left as it was")
+        offsets = np.asarray(self._offsets, dtype=np.int64)
+
+        meta = {
+            "dim": self.dim,
+            "count": self.count,
+            "dtype": self.dtype.name,
+            "quantization": self.quantization,
+        }
+
+        if self.count >= ivf_threshold:
+            meta["nlist"] = self._build_ivf(offsets)
+        else:
+            np.save(self.path / "doc_offsets.npy", offsets)
+
+        if self.quantization != "none":
+            self._write_codes()
+
+        (self.path / "meta.json").write_text(json.dumps(meta))
+        self._swap()
+
+    def _swap(self):
+        # A directory can't be replaced while it has files, the old one steps aside first
+        old = self.target.with_name(f".{self.target.name}.{os.getpid()}.old")
+        if self.target.exists():
+            os.replace(self.target, old)
+        os.replace(self.path, self.target)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _write_codes(self):
+        vectors = np.memmap(
+            self.path / "vectors.bin",
+            dtype=self.dtype,
+            mode="r",
+            shape=(self.count, self.dim),
+        )
+
+        scale = None
+        if self.quantization == "int8":
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(
+                rng.choice(self.count, min(self.count, 100_000), replace=False)
+            )
+            scale = int8_scale(vectors[sample_rows].astype(np.float32))
+            np.save(self.path / "int8_scale.npy", scale)
+
+        with open(self.path / "codes.bin", "wb") as f:
+            for start in range(0, self.count, SCAN_BLOCK):
+                block = vectors[start : start + SCAN_BLOCK].astype(np.float32)
+                f.write(quantize(block, self.quantization, scale).tobytes())
+
+    def _build_ivf(self, offsets: np.ndarray) -> int:
+        vectors = np.memmap(
+            self.path / "vectors.bin",
+            dtype=self.dtype,
+            mode="r",
+            shape=(self.count, self.dim),
+        )
+
+        nlist = int(np.sqrt(self.count))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(
+            rng.choice(self.count, min(self.count, nlist * 64), replace=False)
+        )
+        centroids = _kmeans(vectors[sample_rows].astype(np.float32), nlist)
+
+        assignments = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, SCAN_BLOCK):
+            block = vectors[start : start + SCAN_BLOCK].astype(np.float32)
+            assignments[start : start + SCAN_BLOCK] = np.argmax(
+                block @ centroids.T, axis=1
+            )
+
+        # Rows are rewritten grouped by cluster so every inverted list is a contiguous slice
+        order = np.argsort(assignments, kind="stable")
+        with open(self.path / "vectors.ivf.bin", "wb") as f:
+            for start in range(0, self.count, SCAN_BLOCK):
+                f.write(vectors[order[start : start + SCAN_BLOCK]].tobytes())
+        del vectors
+        os.replace(self.path / "vectors.ivf.bin", self.path / "vectors.bin")
+
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=list_offsets[1:])
+
+        np.save(self.path / "centroids.npy", centroids)
+        np.save(self.path / "list_offsets.npy", list_offsets)
+        # Document offsets follow the new row order, one (start, end) pair per row
+        np.save(
+            self.path / "doc_offsets.npy",
+            np.stack([offsets[:-1][order], offsets[1:][order]], axis=1),
+        )
+
+        return nlist
+
+
+class NumpyVectorStore:
+    """In-process vector store over an index written by NumpyIndexWriter."""
+
+    def __init__(
+        self,
+        path: Path,
+        embedding: Embeddings,
+        nprobe: int = 8,
+        oversampling: float = 4.0,
+    ):
+        self.path = path
+        self.embedding = embedding
+        self.nprobe = nprobe
+        self.oversampling = oversampling
+
+        meta = json.loads((path / "meta.json").read_text())
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.vectors = np.memmap(
+            path / "vectors.bin",
+            dtype=meta["dtype"],
+            mode="r",
+            shape=(self.count, self.dim),
+        )
+
+        self.doc_offsets = np.load(path / "doc_offsets.npy")
+        if self.doc_offsets.ndim == 1:
+            self.doc_offsets = np.stack(
+                [self.doc_offsets[:-1], self.doc_offsets[1:]], axis=1
+            )
+
+        # Quantized codes are held in RAM, full precision vectors stay on disk for rescoring
+        self.quantization = meta.get("quantization", "none")
+        self.codes = None
+        self.scale = None
+        if self.quantization != "none":
+            code_dim = self.dim if self.quantization == "int8" else (self.dim + 7) // 8
+            code_type = np.int8 if self.quantization == "int8" else np.uint8
+            self.codes = np.fromfile(path / "codes.bin", dtype=code_type).reshape(
+                self.count, code_dim
+            )
+        if self.quantization == "int8":
+            self.scale = np.load(path / "int8_scale.npy")
+
+        self.centroids = None
+        if "nlist" in meta:
+            self.centroids = np.load(path / "centroids.npy")
+            self.list_offsets = np.load(path / "list_offsets.npy")
+
+        self._docs_fd = os.open(path / "docs.jsonl", os.O_RDONLY)
+        self._rows_by_id: dict[str, int] | None = None
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs
+    ) -> list[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score_by_vector(embedding, k)
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs
+    ) -> list[tuple[Document, float]]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        candidates = k if self.codes is None else int(k * self.oversampling)
+
+        if self.centroids is None:
+            rows, scores = self._scan(query, 0, self.count, candidates)
+        else:
+            rows, scores = self._probe(query, candidates)
+
+        if self.codes is not None:
+            rows, scores = self._rescore(query, rows, k)
+
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def batch_similarity_search_by_vector(
+        self, embeddings: list[list[float]], k: int = 4, **kwargs
+    ) -> list[list[Document]]:
+        if self.centroids is not None or self.codes is not None:
+            return [self.similarity_search_by_vector(e, k) for e in embeddings]
+
+        # One pass over the vectors scores every query of the batch
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        scores = np.empty((len(queries), self.count), dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK):
+            block = self.vectors[start : start + SCAN_BLOCK]
+            scores[:, start : start + len(block)] = (
+                queries @ block.astype(np.float32, copy=False).T
+            )
+
+        return [
+            [self._document(row) for row in self._top_k(query_scores, k, 0)[0]]
+            for query_scores in scores
+        ]
+
+    def get_by_ids(self, ids: list[str]) -> list[Document]:
+        if self._rows_by_id is None:
+            self._rows_by_id = {self._read(row)["id"]: row for row in range(self.count)}
+        return [
+            self._document(self._rows_by_id[point_id])
+            for point_id in ids
+            if point_id in self._rows_by_id
+        ]
+
+    def _scan(
+        self, query: np.ndarray, start: int, end: int, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        scores = np.empty(end - start, dtype=np.float32)
+        for block_start in range(start, end, SCAN_BLOCK):
+            block_end = min(block_start + SCAN_BLOCK, end)
+            if self.codes is None:
+                block_scores = (
+                    self.vectors[block_start:block_end].astype(np.float32, copy=False)
+                    @ query
+                )
+            else:
+                block_scores = approximate_scores(
+                    self.codes[block_start:block_end],
+                    query,
+                    self.quantization,
+                    self.scale,
+                )
+            scores[block_start - start : block_end - start] = block_scores
+
+        return self._top_k(scores, k, start)
+
+    def _rescore(
+        self, query: np.ndarray, rows: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        rows = np.sort(rows)
+        scores = self.vectors[rows].astype(np.float32) @ query
+        best = np.argsort(-scores)[:k]
+        return rows[best], scores[best]
+
+    def _probe(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        lists = np.argsort(-(self.centroids @ query))[: self.nprobe]
+
+        rows, scores = [], []
+        for cluster in lists:
+            start, end = self.list_offsets[cluster], self.list_offsets[cluster + 1]
+            if end > start:
+                list_rows, list_scores = self._scan(query, start, end, k)
+                rows.append(list_rows)
+                scores.append(list_scores)
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        best = np.argsort(-scores)[:k]
+        return rows[best], scores[best]
+
+    @staticmethod
+    def _top_k(
+        scores: np.ndarray, k: int, offset: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, np.int64), scores[:0]
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return candidates + offset, scores[candidates]
+
+    def _read(self, row: int) -> dict:
+        start, end = self.doc_offsets[row]
+        # pread keeps no shared file position, so the store is safe across threads and forks
+        return json.loads(os.pread(self._docs_fd, int(end - start), int(start)))
+
+    def _document(self, row: int) -> Document:
+        record = self._read(row)
+        metadata = record["metadata"]
+        metadata["_id"] = record["id"]
+        return Document(page_content=record["page_content"], metadata=metadata)
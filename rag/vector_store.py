@@ -0,0 +1,97 @@
+import os
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+from .bm25 import DEFAULT_BM25_INDEX
+
+DEFAULT_NUMPY_INDEX = Path(__file__).parent / "numpy_index"
+RESCORE_OVERSAMPLING = float(os.getenv("RESCORE_OVERSAMPLING", "4.0"))
+
+
+def open_vector_store(embedding: Embeddings):
+    vector_store = open_dense_store(embedding)
+
+    # Hybrid search is used whenever rag.index has written a keyword index, HYBRID_SEARCH=0 turns it off
+    bm25_path = Path(os.getenv("BM25_INDEX_PATH", DEFAULT_BM25_INDEX))
+    if os.getenv("HYBRID_SEARCH", "1") == "1" and (bm25_path / "meta.json").exists():
+        from .bm25 import BM25Index
+        from .hybrid import HybridRetriever
+
+        return HybridRetriever(vector_store, BM25Index(bm25_path))
+
+    return vector_store
+
+
+def open_dense_store(embedding: Embeddings):
+    # VECTOR_STORE=numpy serves queries in-process from an index written by rag.index
+    if os.getenv("VECTOR_STORE", "qdrant") == "numpy":
+        from .numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(
+            Path(os.getenv("NUMPY_INDEX_PATH", DEFAULT_NUMPY_INDEX)),
+            embedding,
+            oversampling=RESCORE_OVERSAMPLING,
+        )
+
+    from langchain_qdrant import QdrantVectorStore
+
+    return QdrantVectorStore.from_existing_collection(
+        url="http://localhost:6333",
+        collection_name="learning_rag",
+        embedding=embedding,
+    )
+
+
+def search_params():
+    # Quantized collections search the codes first, then rescore with the original vectors
+    from qdrant_client import models
+
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=RESCORE_OVERSAMPLING
+        )
+    )
+
+
+def batch_search(
+    vector_store, queries: list[str], embeddings: list[list[float]], k: int, **kwargs
+):
+    """Searches a batch of already embedded queries in as few round trips as the store allows."""
+    from .hybrid import HybridRetriever
+    from .numpy_store import NumpyVectorStore
+
+    if isinstance(vector_store, HybridRetriever):
+        return vector_store.batch_similarity_search_by_vector(
+            queries, embeddings, k, **kwargs
+        )
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.batch_similarity_search_by_vector(embeddings, k)
+
+    from qdrant_client import models
+
+    responses = vector_store.client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[
+            models.QueryRequest(
+                query=embedding,
+                using=vector_store.vector_name,
+                limit=k,
+                params=kwargs.get("search_params"),
+                with_payload=True,
+            )
+            for embedding in embeddings
+        ],
+    )
+    return [
+        [
+            vector_store._document_from_point(
+                point,
+                vector_store.collection_name,
+                vector_store.content_payload_key,
+                vector_store.metadata_payload_key,
+            )
+            for point in response.points
+        ]
+        for response in responses
+    ]
@@ -0,0 +1,62 @@
+import math
+import os
+import time
+from redis.asyncio import Redis
+from rq import Queue
+from rq.worker_registration import WORKERS_BY_QUEUE_KEY
+
+# Jobs waiting in a lane and the lanes ahead of it before new work is refused
+MAX_QUEUE_DEPTH = {
+    "interactive": int(os.getenv("RAG_MAX_INTERACTIVE_DEPTH", "100")),
+    "batch": int(os.getenv("RAG_MAX_BATCH_DEPTH", "1000")),
+}
+MAX_WAIT = {
+    "interactive": float(os.getenv("RAG_MAX_INTERACTIVE_WAIT", "30")),
+    "batch": float(os.getenv("RAG_MAX_BATCH_WAIT", "600")),
+}
+# Average time a worker spends on one job, used to estimate the queue wait
+JOB_SECONDS = float(os.getenv("RAG_JOB_SECONDS", "2"))
+
+CLIENT_QUOTA = int(os.getenv("RAG_CLIENT_QUOTA", "60"))
+QUOTA_WINDOW = int(os.getenv("RAG_QUOTA_WINDOW", "60"))
+
+
+async def check_quota(redis: Redis, client_id: str) -> int | None:
+    """Counts a request of the client, returns the seconds until it may retry
+    when its quota for the current window is used up."""
+    window = int(time.time()) // QUOTA_WINDOW
+    key = f"rag_queue:quota:{client_id}:{window}"
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.incr(key)
+    pipeline.expire(key, QUOTA_WINDOW)
+    count, _ = await pipeline.execute()
+
+    if count <= CLIENT_QUOTA:
+        return None
+    return QUOTA_WINDOW - int(time.time()) % QUOTA_WINDOW
+
+
+async def check_capacity(redis: Redis, queues: list[Queue], lane: str) -> int | None:
+    """Returns the seconds until a retry is worthwhile when a new job in `lane`
+    would wait longer than allowed, None when it is admitted."""
+    # Workers drain the lanes in order, so every job in this lane and the
+    # ones before it runs first
+    ahead = queues[: [queue.name for queue in queues].index(lane) + 1]
+
+    pipeline = redis.pipeline(transaction=False)
+    for queue in ahead:
+        pipeline.llen(queue.key)
+    pipeline.scard(WORKERS_BY_QUEUE_KEY % lane)
+    *depths, workers = await pipeline.execute()
+
+    depth = sum(depths)
+    wait = depth * JOB_SECONDS / max(workers, 1)
+    excess = max(
+        wait - MAX_WAIT[lane],
+        (depth - MAX_QUEUE_DEPTH[lane]) * JOB_SECONDS / max(workers, 1),
+    )
+
+    if depth < MAX_QUEUE_DEPTH[lane] and wait <= MAX_WAIT[lane]:
+        return None
+    return max(1, math.ceil(excess))
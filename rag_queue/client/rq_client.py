@@ -1,4 +1,17 @@
+import os
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from rq import Queue
 
-queue = Queue(connection=Redis(host="localhost", port=6379))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+redis_connection = Redis.from_url(REDIS_URL)
+
+# Used by the API server, every request shares its connection pool
+async_redis = AsyncRedis.from_url(REDIS_URL)
+
+# Priority lanes, workers listen on all of them in this order and always take
+# the next job from the first non-empty one
+interactive_queue = Queue("interactive", connection=redis_connection)
+batch_queue = Queue("batch", connection=redis_connection)
+queues = [interactive_queue, batch_queue]
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from redis import Redis
+from rq.job import Job
+
+# Upper bound for a job to be picked up and finish, a crashed worker never
+# releases its key and it must not block the query forever
+INFLIGHT_TTL = 600
+# How long a finished answer keeps being handed out to identical queries
+RESULT_TTL = int(os.getenv("RAG_DEDUPE_TTL", "30"))
+
+# Only touch the key while it still points to the job, a newer job may own it
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return redis.call('del', KEYS[1])
+"""
+
+# Claim the key from an owner whose job ended, unless another request did first.
+# Returns the owner that got there first, nothing when the claim succeeded.
+TAKEOVER_SCRIPT = """
+local owner = redis.call('get', KEYS[1])
+if owner and owner ~= ARGV[1] then
+    return owner
+end
+redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return false
+"""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def dedupe_key(query: str) -> str:
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"rag_queue:inflight:{digest}"
+
+
+def _release(connection: Redis, job: Job, ttl: int):
+    key = job.meta.get("dedupe_key")
+    if key:
+        connection.eval(RELEASE_SCRIPT, 1, key, job.id, ttl)
+
+
+def on_success(job: Job, connection: Redis, result):
+    _release(connection, job, RESULT_TTL)
+
+
+def on_failure(job: Job, connection: Redis, *exc_info):
+    _release(connection, job, 0)
@@ -0,0 +1,42 @@
+from redis.asyncio import Redis
+from rq.job import Job, JobStatus
+from rq.results import Result
+
+ENDED = {JobStatus.FINISHED, JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED}
+
+
+async def fetch_statuses(redis: Redis, job_ids: list[str]) -> list[dict | None]:
+    """Status and result of many jobs in one round trip, None for unknown ids."""
+    pipeline = redis.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipeline.hget(Job.key_for(job_id), "status")
+        pipeline.xrevrange(Result.get_key(job_id), "+", "-", count=1)
+    replies = await pipeline.execute()
+
+    statuses = []
+    for job_id, status, entries in zip(job_ids, replies[::2], replies[1::2]):
+        if status is None:
+            statuses.append(None)
+            continue
+
+        result = None
+        if entries:
+            result_id, payload = entries[0]
+            result = Result.restore(
+                job_id, result_id.decode(), payload, connection=None
+            ).return_value
+        statuses.append({"status": status.decode(), "result": result})
+
+    return statuses
+
+
+async def wait_for_job(redis: Redis, job_id: str, timeout: float) -> dict | None:
+    """Status of a job once it has ended, or after `timeout` seconds."""
+    status = (await fetch_statuses(redis, [job_id]))[0]
+    if status is None or status["status"] in ENDED or timeout <= 0:
+        return status
+
+    # Workers append to the results stream in the same transaction that ends
+    # the job, so blocking on it wakes up as soon as the job is done
+    await redis.xread({Result.get_key(job_id): "0-0"}, block=int(timeout * 1000))
+    return (await fetch_statuses(redis, [job_id]))[0]
@@ -0,0 +1,102 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from redis import Redis
+
+METRICS_KEY = "rag_queue:metrics"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "rag_stage_duration_seconds": ("histogram", "Time spent in each stage of a query"),
+    "rag_queue_wait_seconds": ("histogram", "Time from enqueue to the start of a job"),
+    "rag_llm_tokens_total": ("counter", "Tokens used by the LLM calls"),
+    "rag_cache_requests_total": ("counter", "Embedding and semantic cache lookups"),
+    "rag_jobs_total": ("counter", "Processed queries"),
+}
+
+SAMPLE_PATTERN = re.compile(r"^(\w+?)(_bucket|_sum|_count)?(?:\{(.*)\})?$")
+
+
+def _sample(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    """Collects observations in process memory, `flush` adds them to the totals
+    of all workers in Redis with one pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[str, float] = defaultdict(float)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._values[_sample(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            # Buckets are cumulative, every bound above the value counts it. The
+            # others get 0 so that all buckets of a label set exist.
+            for bound in BUCKETS:
+                self._values[_sample(f"{name}_bucket", {**labels, "le": bound})] += (
+                    value <= bound
+                )
+            self._values[_sample(f"{name}_bucket", {**labels, "le": "+Inf"})] += 1
+            self._values[_sample(f"{name}_sum", labels)] += value
+            self._values[_sample(f"{name}_count", labels)] += 1
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def flush(self, redis: Redis):
+        with self._lock:
+            values, self._values = self._values, defaultdict(float)
+        if not values:
+            return
+
+        pipeline = redis.pipeline(transaction=False)
+        for field, value in values.items():
+            pipeline.hincrbyfloat(METRICS_KEY, field, value)
+        pipeline.execute()
+
+
+def _sort_key(field: str):
+    name, suffix, labels = SAMPLE_PATTERN.match(field).groups()
+    le = re.search(r'le="([^"]+)"', labels or "")
+    labels = re.sub(r',?le="[^"]+"', "", labels or "")
+    return (
+        name,
+        labels,
+        ["_bucket", "_sum", "_count"].index(suffix) if suffix else 0,
+        float(le.group(1)) if le else 0.0,
+    )
+
+
+def render(values: dict[bytes, bytes]) -> str:
+    """Prometheus text format of the totals stored under METRICS_KEY."""
+    by_metric = defaultdict(list)
+    for field, value in values.items():
+        field = field.decode()
+        by_metric[SAMPLE_PATTERN.match(field).group(1)].append((field, float(value)))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for field, value in sorted(by_metric[name], key=lambda s: _sort_key(s[0])):
+            lines.append(f"{field} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
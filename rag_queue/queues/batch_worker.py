@@ -0,0 +1,113 @@
+import os
+import time
+from rq import SimpleWorker
+from rq.executions import Execution
+from rq.timeouts import JobTimeoutException
+from rq.utils import now
+from rq.job import Job
+from rq.queue import Queue
+from . import worker
+from ..metrics import metrics
+
+PROCESS_QUERY = "rag_queue.queues.worker.process_query"
+
+
+class BatchWorker(SimpleWorker):
+    """Collects up to `batch_size` queued queries, or what arrives within `max_wait`,
+    and answers them with one embedding pass, one vector search and concurrent LLM calls.
+
+    Each job then still goes through the regular rq execution, which picks up its
+    precomputed result, so statuses, results and failures are recorded per job.
+    The whole batch is marked started before it runs and shares the longest job
+    timeout, so a worker that dies mid-batch leaves every job to be cleaned up.
+
+    rq worker -w rag_queue.queues.batch_worker.BatchWorker interactive batch
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = int(os.getenv("RAG_BATCH_SIZE", "8"))
+        self.max_wait = float(os.getenv("RAG_BATCH_WAIT_MS", "5")) / 1000
+        self._executions: dict[str, Execution] = {}
+
+    def prepare_execution(self, job: Job) -> Execution:
+        # Jobs of a batch were registered as started when the batch began
+        if job.id in self._executions:
+            self.execution = self._executions.pop(job.id)
+            return self.execution
+        return super().prepare_execution(job)
+
+    def execute_job(self, job: Job, queue: Queue):
+        batch = [(job, queue)] + self._collect_batch()
+        timeout = max(
+            batch_job.timeout or self.queue_class.DEFAULT_TIMEOUT
+            for batch_job, _ in batch
+        )
+        self._start(batch, timeout)
+
+        queries = {
+            batch_job.id: batch_job.args[0]
+            for batch_job, _ in batch
+            if batch_job.func_name == PROCESS_QUERY
+        }
+        for batch_job, _ in batch:
+            if batch_job.id not in queries:
+                continue
+            metrics.observe(
+                "rag_queue_wait_seconds",
+                (now() - batch_job.enqueued_at).total_seconds(),
+            )
+
+        if queries:
+            try:
+                with self.death_penalty_class(
+                    timeout, JobTimeoutException, job_id=job.id
+                ):
+                    with metrics.time("rag_stage_duration_seconds", stage="total"):
+                        results = worker.process_queries(
+                            list(queries.values()), list(queries)
+                        )
+            except Exception as error:
+                results = [error] * len(queries)
+            worker.batch_results.update(zip(queries, results))
+
+        try:
+            for batch_job, batch_queue in batch:
+                super().execute_job(batch_job, batch_queue)
+        finally:
+            worker.batch_results.clear()
+            self._executions.clear()
+
+    def _start(self, batch: list[tuple[Job, Queue]], timeout: int):
+        """Puts every job of the batch in its StartedJobRegistry, with a TTL
+        that outlasts the batch, the way rq does for the job it runs."""
+        with self.connection.pipeline() as pipeline:
+            for batch_job, _ in batch:
+                self._executions[batch_job.id] = Execution.create(
+                    batch_job,
+                    max(timeout, self.job_monitoring_interval) + 60,
+                    pipeline=pipeline,
+                )
+                batch_job.prepare_for_execution(self.name, pipeline=pipeline)
+            pipeline.execute()
+
+    def _collect_batch(self) -> list[tuple[Job, Queue]]:
+        batch = []
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.batch_size - 1:
+            result = self.queue_class.dequeue_any(
+                self._ordered_queues,
+                None,
+                connection=self.connection,
+                job_class=self.job_class,
+                serializer=self.serializer,
+            )
+            if result is not None:
+                batch.append(result)
+            elif time.monotonic() >= deadline:
+                break
+            else:
+                time.sleep(0.001)
+
+        return batch
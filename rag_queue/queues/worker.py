@@ -1,42 +1,55 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 from openai.types.chat import ChatCompletionMessageParam
-from openai import OpenAI
 from dotenv import load_dotenv
+import hashlib
 import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
+import time
+from rq import get_current_job
+from llm import get_client
+from rag.context import CONTEXT_CANDIDATES, build_context
+from rag.vector_store import batch_search, search_params
+from ..client.rq_client import redis_connection
+from ..metrics import metrics
+from ..semantic_cache import SemanticCache
+from ..token_stream import TokenPublisher
 
 load_dotenv()
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise RuntimeError("GEMINI_API_KEY not set")
 
-client = OpenAI(
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-    api_key=api_key,
-)
+# The model and the vector store are only loaded by the first job a worker runs,
+# so importing this module to reference process_query stays cheap.
+@cache
+def get_embedding_model():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from rag.embedding_cache import CachedEmbeddings
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+    return CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    )
 
-vector_db = QdrantVectorStore.from_existing_collection(
-    url="http://localhost:6333",
-    collection_name="learning_rag",
-    embedding=embedding_model,
-)
 
+@cache
+def get_vector_db():
+    from rag.vector_store import open_vector_store
 
-def process_query(user_query: str):
-    search_result = vector_db.similarity_search(query=user_query, k=3)
+    return open_vector_store(get_embedding_model())
 
-    context = "\n\n\n".join(
-        [
-            f"Page Content: {result.page_content}\nPage Number: {result.metadata['page_label']}\nFile Location: {result.metadata['source']}"
-            for result in search_result
-        ]
+
+@cache
+def get_semantic_cache() -> SemanticCache:
+    return SemanticCache(
+        redis_connection,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        ttl=int(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
     )
 
+
+def answer_query(
+    user_query: str, context: str, on_token: Callable[[str], None] | None = None
+) -> str:
     SYSTEM_PROMPT = f"""
     You are a helpfull AI assistant who answers user queries based on the available context returived from a PDF file along with page_contents and page number.
 
@@ -51,9 +64,147 @@ def process_query(user_query: str):
         {"role": "user", "content": user_query},
     ]
 
-    response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        messages=message_history,
+    with metrics.time("rag_stage_duration_seconds", stage="llm_request"):
+        response = get_client("gemini").chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=message_history,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+    start = time.perf_counter()
+    parts = []
+    for chunk in response:
+        if chunk.usage:
+            metrics.inc(
+                "rag_llm_tokens_total", chunk.usage.prompt_tokens, kind="prompt"
+            )
+            metrics.inc(
+                "rag_llm_tokens_total", chunk.usage.completion_tokens, kind="completion"
+            )
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        if not parts:
+            metrics.observe(
+                "rag_stage_duration_seconds",
+                time.perf_counter() - start,
+                stage="llm_first_token",
+            )
+        parts.append(chunk.choices[0].delta.content)
+        if on_token is not None:
+            on_token(parts[-1])
+
+    return "".join(parts)
+
+
+def process_queries(
+    user_queries: list[str], job_ids: list[str | None] | None = None
+) -> list[str | BaseException]:
+    semantic_cache = get_semantic_cache()
+    publishers = [
+        TokenPublisher(redis_connection, job_id) if job_id else None
+        for job_id in job_ids or [None] * len(user_queries)
+    ]
+
+    # One encoder pass and one vector search round trip for the whole batch
+    embedding_model = get_embedding_model()
+    before = embedding_model.stats()
+    with metrics.time("rag_stage_duration_seconds", stage="embed"):
+        query_vectors = embedding_model.embed_queries(user_queries)
+    after = embedding_model.stats()
+    for result in ("hits", "misses"):
+        metrics.inc(
+            "rag_cache_requests_total",
+            after[result] - before[result],
+            cache="embedding",
+            result=result,
+        )
+
+    with metrics.time("rag_stage_duration_seconds", stage="search"):
+        search_results = batch_search(
+            get_vector_db(),
+            user_queries,
+            query_vectors,
+            CONTEXT_CANDIDATES,
+            search_params=search_params(),
+        )
+
+    results: list[str | BaseException | None] = [None] * len(user_queries)
+    pending = []
+
+    for i, search_result in enumerate(search_results):
+        with metrics.time("rag_stage_duration_seconds", stage="context"):
+            context = build_context(search_result)
+            context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+        with metrics.time("rag_stage_duration_seconds", stage="semantic_cache"):
+            cached_answer = semantic_cache.lookup(query_vectors[i], context_hash)
+        metrics.inc(
+            "rag_cache_requests_total",
+            cache="semantic",
+            result="misses" if cached_answer is None else "hits",
+        )
+        if cached_answer is not None:
+            results[i] = cached_answer
+            if publishers[i] is not None:
+                publishers[i].token(cached_answer)
+        else:
+            pending.append((i, context, context_hash))
+
+    def complete(i: int, context: str, context_hash: str) -> str:
+        publisher = publishers[i]
+        with metrics.time("rag_stage_duration_seconds", stage="llm"):
+            answer = answer_query(
+                user_queries[i], context, publisher.token if publisher else None
+            )
+        semantic_cache.store(query_vectors[i], context_hash, answer)
+        return answer
+
+    # The LLM calls are network bound, so they run concurrently
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = [(item[0], pool.submit(complete, *item)) for item in pending]
+        for i, future in futures:
+            results[i] = future.exception() or future.result()
+
+    return results
+
+
+# Filled by BatchWorker with the results of the jobs in its current batch
+batch_results: dict[str, str | BaseException] = {}
+
+
+def process_query(user_query: str):
+    job = get_current_job()
+
+    if job is not None and job.id in batch_results:
+        result = batch_results.pop(job.id)
+    else:
+        if job is not None:
+            metrics.observe(
+                "rag_queue_wait_seconds",
+                (job.started_at - job.enqueued_at).total_seconds(),
+            )
+        # Failures are published and counted like the results of a batch
+        try:
+            with metrics.time("rag_stage_duration_seconds", stage="total"):
+                result = process_queries([user_query], [job.id if job else None])[0]
+        except Exception as error:
+            result = error
+
+    if job is not None:
+        publisher = TokenPublisher(redis_connection, job.id)
+        if isinstance(result, BaseException):
+            publisher.error(f"{result}")
+        else:
+            publisher.done(result)
+
+    metrics.inc(
+        "rag_jobs_total",
+        result="failure" if isinstance(result, BaseException) else "success",
     )
+    metrics.flush(redis_connection)
 
-    return f"{response.choices[0].message.content}"
+    if isinstance(result, BaseException):
+        raise result
+    return result
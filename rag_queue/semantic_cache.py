@@ -0,0 +1,151 @@
+import time
+import uuid
+from itertools import combinations
+
+import numpy as np
+from redis import Redis
+
+
+class SemanticCache:
+    """Answers of earlier queries, shared by all workers through Redis.
+
+    A cached answer is reused when a new query embedding is within `threshold`
+    cosine similarity of a cached one and the retrieved context is the same.
+    Entries are bucketed by random hyperplane signatures and a lookup only
+    compares against the buckets within `probe_radius` flipped bits, where
+    nearly all queries above the threshold land.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        threshold: float = 0.95,
+        ttl: int = 3600,
+        max_entries: int = 10_000,
+        planes: int = 12,
+        probe_radius: int = 2,
+        namespace: str = "semantic_cache",
+    ):
+        self.redis = redis
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.planes = planes
+        self.namespace = namespace
+        self._hyperplanes: np.ndarray | None = None
+        self._probe_masks = [
+            sum(1 << bit for bit in flipped)
+            for radius in range(probe_radius + 1)
+            for flipped in combinations(range(planes), radius)
+        ]
+
+    def _signature(self, vector: np.ndarray) -> int:
+        if self._hyperplanes is None:
+            # Fixed seed, every worker has to derive the same buckets
+            rng = np.random.default_rng(1234)
+            self._hyperplanes = rng.normal(size=(self.planes, len(vector)))
+        bits = (self._hyperplanes @ vector) > 0
+        return sum(1 << i for i, bit in enumerate(bits) if bit)
+
+    def _bucket_key(self, signature: int) -> str:
+        return f"{self.namespace}:bucket:{signature}"
+
+    def _entry_key(self, entry_id: str) -> str:
+        return f"{self.namespace}:entry:{entry_id}"
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, query_vector: list[float], context_hash: str) -> str | None:
+        vector = self._normalize(query_vector)
+        signature = self._signature(vector)
+        bucket_keys = [self._bucket_key(signature ^ mask) for mask in self._probe_masks]
+        members = {
+            entry_id.decode(): bucket_key
+            for bucket_key, bucket in zip(
+                bucket_keys, self._pipeline_smembers(bucket_keys)
+            )
+            for entry_id in bucket
+        }
+        entry_ids = list(members)
+
+        pipeline = self.redis.pipeline()
+        for entry_id in entry_ids:
+            pipeline.hmget(self._entry_key(entry_id), "vector", "context")
+        entries = pipeline.execute()
+
+        best_id, best_score = None, self.threshold
+        for entry_id, (cached_vector, context) in zip(entry_ids, entries):
+            if cached_vector is None or context.decode() != context_hash:
+                continue
+
+            score = float(np.frombuffer(cached_vector, dtype=np.float32) @ vector)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        answer = None
+        pipeline = self.redis.pipeline()
+        for entry_id, (cached_vector, _) in zip(entry_ids, entries):
+            if cached_vector is None:
+                # Expired or evicted entries leave their bucket membership behind
+                pipeline.srem(members[entry_id], entry_id)
+                pipeline.zrem(f"{self.namespace}:lru", entry_id)
+        if best_id is not None:
+            pipeline.hget(self._entry_key(best_id), "answer")
+            pipeline.zadd(f"{self.namespace}:lru", {best_id: time.time()}, xx=True)
+        results = pipeline.execute()
+
+        # The best entry may have expired since it was scored, that is a miss
+        if best_id is not None and results[-2] is not None:
+            answer = results[-2].decode()
+        self.redis.incr(
+            f"{self.namespace}:{'hits' if answer is not None else 'misses'}"
+        )
+        return answer
+
+    def _pipeline_smembers(self, keys: list[str]) -> list[set]:
+        pipeline = self.redis.pipeline()
+        for key in keys:
+            pipeline.smembers(key)
+        return pipeline.execute()
+
+    def store(self, query_vector: list[float], context_hash: str, answer: str):
+        vector = self._normalize(query_vector)
+        bucket_key = self._bucket_key(self._signature(vector))
+        entry_id = uuid.uuid4().hex
+        lru_key = f"{self.namespace}:lru"
+
+        pipeline = self.redis.pipeline()
+        pipeline.hset(
+            self._entry_key(entry_id),
+            mapping={
+                "vector": vector.tobytes(),
+                "context": context_hash,
+                "answer": answer,
+            },
+        )
+        pipeline.expire(self._entry_key(entry_id), self.ttl)
+        pipeline.sadd(bucket_key, entry_id)
+        pipeline.expire(bucket_key, self.ttl)
+        pipeline.zadd(lru_key, {entry_id: time.time()})
+        pipeline.zcard(lru_key)
+        size = pipeline.execute()[-1]
+
+        if size > self.max_entries:
+            evicted = self.redis.zpopmin(lru_key, size - self.max_entries)
+            # Their bucket memberships are dropped by the next lookup that sees them
+            self.redis.delete(*[self._entry_key(e.decode()) for e, _ in evicted])
+
+    def stats(self) -> dict:
+        hits, misses = self.redis.mget(
+            f"{self.namespace}:hits", f"{self.namespace}:misses"
+        )
+        hits, misses = int(hits or 0), int(misses or 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": self.redis.zcard(f"{self.namespace}:lru"),
+        }
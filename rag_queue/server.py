@@ -1,28 +1,147 @@
-from fastapi import FastAPI, Query
-from .client.rq_client import queue
-from .queues.worker import process_query
+import uuid
+from typing import Literal
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from rq import Callback
+from rq.job import JobStatus
+from .admission import check_capacity, check_quota
+from .client.rq_client import async_redis, queues
+from .dedupe import (
+    INFLIGHT_TTL,
+    RELEASE_SCRIPT,
+    TAKEOVER_SCRIPT,
+    dedupe_key,
+    on_failure,
+    on_success,
+)
+from .job_status import ENDED, fetch_statuses, wait_for_job
+from .metrics import METRICS_KEY, render
+from .token_stream import read_events
 
 app = FastAPI()
 
+# Jobs reference the worker function by name, so the API process never imports
+# the worker module with its embedding model, vector store and LLM client
+PROCESS_QUERY = "rag_queue.queues.worker.process_query"
+MAX_POLL_WAIT = 30.0
+QUEUES = {queue.name: queue for queue in queues}
+
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "Server running"}
 
 
 @app.post("/chat")
-def chat(query: str = Query(..., description="The chat query of user")):
-    job = queue.enqueue(process_query, query)
+async def chat(
+    request: Request,
+    query: str = Query(..., description="The chat query of user"),
+    priority: Literal["interactive", "batch"] = Query(
+        "interactive", description="Queue lane of the job"
+    ),
+):
+    # Some ASGI servers and test clients leave out the client address
+    client_id = request.headers.get("X-Client-Id") or (
+        request.client.host if request.client else "unknown"
+    )
+    retry_after = await check_quota(async_redis, client_id)
+    if retry_after is not None:
+        raise HTTPException(
+            429, "Request quota exceeded", {"Retry-After": str(retry_after)}
+        )
+
+    # Identical queries share the job that is queued, running or recently
+    # finished for them, whoever claims the key first enqueues it
+    key = dedupe_key(query)
+    job_id = uuid.uuid4().hex
+    existing = await async_redis.set(key, job_id, nx=True, ex=INFLIGHT_TTL, get=True)
+
+    if existing is not None:
+        existing = existing.decode()
+        status = (await fetch_statuses(async_redis, [existing]))[0]
+        # A missing job is still being enqueued by the request that claimed the key
+        if status is None or status["status"] not in ENDED - {JobStatus.FINISHED}:
+            return {
+                "status": status["status"] if status else "queued",
+                "job_id": existing,
+                "deduplicated": True,
+            }
+        owner = await async_redis.eval(
+            TAKEOVER_SCRIPT, 1, key, existing, job_id, INFLIGHT_TTL
+        )
+        if owner is not None:
+            # Another request replaced the ended job first, share its new one
+            return {"status": "queued", "job_id": owner.decode(), "deduplicated": True}
+
+    # Only new jobs add load, so only they are turned away when the lanes are full
+    retry_after = await check_capacity(async_redis, queues, priority)
+    if retry_after is not None:
+        await async_redis.eval(RELEASE_SCRIPT, 1, key, job_id, 0)
+        raise HTTPException(
+            429, "Too many queued queries", {"Retry-After": str(retry_after)}
+        )
 
-    return {"status": "queued", "job_id": job.id}
+    # rq only has a blocking client, enqueueing is a single pipelined round trip
+    try:
+        job = await run_in_threadpool(
+            QUEUES[priority].enqueue,
+            PROCESS_QUERY,
+            query,
+            job_id=job_id,
+            meta={"dedupe_key": key},
+            on_success=Callback(on_success),
+            on_failure=Callback(on_failure),
+        )
+    except Exception:
+        # Identical queries would otherwise wait on a job that never existed
+        await async_redis.eval(RELEASE_SCRIPT, 1, key, job_id, 0)
+        raise
+
+    return {"status": "queued", "job_id": job.id, "deduplicated": False}
 
 
 @app.get("/job-status")
-def get_result(job_id: str = Query(..., description="Job id")):
-    job = queue.fetch_job(job_id=job_id)
-    if job is None:
+async def get_result(
+    job_id: str = Query(..., description="Job id"),
+    wait: float = Query(
+        0, ge=0, le=MAX_POLL_WAIT, description="Seconds to wait for the job to end"
+    ),
+):
+    status = await wait_for_job(async_redis, job_id, wait)
+    if status is None:
         return {"status": "error", "message": "Invalid job ID"}
 
-    result = job.return_value()
+    return status
+
+
+@app.post("/job-statuses")
+async def get_results(job_ids: list[str] = Body(..., embed=True)):
+    statuses = await fetch_statuses(async_redis, job_ids)
+
+    return {
+        job_id: status or {"status": "error", "message": "Invalid job ID"}
+        for job_id, status in zip(job_ids, statuses)
+    }
+
+
+@app.get("/chat-stream")
+async def chat_stream(job_id: str = Query(..., description="Job id")):
+    if (await fetch_statuses(async_redis, [job_id]))[0] is None:
+        return {"status": "error", "message": "Invalid job ID"}
+
+    # token events carry the answer piece by piece, done the full answer
+    return StreamingResponse(
+        read_events(async_redis, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-    return {"result": result}
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Totals flushed by all workers, in the Prometheus text format
+    return PlainTextResponse(
+        render(await async_redis.hgetall(METRICS_KEY)),
+        media_type="text/plain; version=0.0.4",
+    )
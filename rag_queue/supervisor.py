@@ -0,0 +1,105 @@
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from rq import SimpleWorker
+from .client.rq_client import queues, redis_connection
+from .queues import worker
+from .queues.batch_worker import BatchWorker
+
+WORKERS = int(os.getenv("RAG_WORKERS", os.cpu_count() or 1))
+# A worker that dies sooner than this after starting is restarted with a delay,
+# doubled for every further early death up to MAX_RESPAWN_DELAY
+MIN_UPTIME = 5.0
+MAX_RESPAWN_DELAY = 60.0
+
+
+def preload():
+    # Loading and running the model once here lets every forked worker share its
+    # weights copy-on-write. Network clients are left to each worker since
+    # sockets must not be shared across a fork.
+    worker.get_embedding_model().embed_query("warm up")
+
+    # Objects that exist now stay out of the collector, whose refcount and
+    # generation writes would otherwise copy the shared pages into each worker
+    gc.freeze()
+
+
+def run_worker(threads: int):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Both run jobs in this process, so the loaded clients are reused across jobs
+    worker_class = (
+        BatchWorker if int(os.getenv("RAG_BATCH_SIZE", "1")) > 1 else SimpleWorker
+    )
+    worker_class(queues, connection=redis_connection).work()
+
+
+def main():
+    threads = max(1, (os.cpu_count() or 1) // WORKERS)
+    preload()
+
+    children: dict[int, float] = {}
+    stopping = threading.Event()
+    early_deaths = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(threads)
+            except BaseException:
+                # os._exit skips the interpreter's error report and buffer flushes
+                traceback.print_exc()
+                sys.stderr.flush()
+                os._exit(1)
+            os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        stopping.set()
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(WORKERS):
+        spawn()
+    print(f"Started {WORKERS} workers with {threads} threads each")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except InterruptedError:
+            continue
+
+        started = children.pop(pid, None)
+        if stopping.is_set() or started is None:
+            continue
+
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        if time.monotonic() - started < MIN_UPTIME:
+            # The stop handler ends the wait, the old workers it signalled are gone
+            # and a worker spawned now would never be told to stop
+            stopping.wait(min(MIN_UPTIME * 2**early_deaths, MAX_RESPAWN_DELAY))
+            early_deaths += 1
+        else:
+            early_deaths = 0
+        if not stopping.is_set():
+            spawn()
+
+
+# python -m rag_queue.supervisor to run a pool of workers sharing one model
+main()
@@ -0,0 +1,82 @@
+import json
+from collections.abc import AsyncIterator
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from .job_status import ENDED, fetch_statuses
+
+# Streams outlive their job long enough for a client that connects late
+STREAM_TTL = 600
+BLOCK_MS = 15_000
+
+
+def stream_key(job_id: str) -> str:
+    return f"rag_queue:tokens:{job_id}"
+
+
+class TokenPublisher:
+    """Appends the answer of a job to a Redis stream as it is generated.
+
+    Entries are `token` events with the next piece of the answer, followed by one
+    `done` event with the full answer or an `error` event.
+    """
+
+    def __init__(self, redis: Redis, job_id: str):
+        self.redis = redis
+        self.key = stream_key(job_id)
+
+    def _add(self, event: str, data: str):
+        pipeline = self.redis.pipeline()
+        pipeline.xadd(self.key, {"event": event, "data": data})
+        pipeline.expire(self.key, STREAM_TTL)
+        pipeline.execute()
+
+    def token(self, text: str):
+        self._add("token", text)
+
+    def done(self, answer: str):
+        self._add("done", answer)
+
+    def error(self, message: str):
+        self._add("error", message)
+
+
+def format_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def read_events(
+    redis: AsyncRedis, job_id: str, block_ms: int = BLOCK_MS
+) -> AsyncIterator[str]:
+    """Yields the stream of a job as Server-Sent Events until it is done or failed."""
+    key = stream_key(job_id)
+    last_id = "0"
+
+    while True:
+        response = await redis.xread({key: last_id}, block=block_ms)
+
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                event = fields[b"event"].decode()
+                yield format_event(event, fields[b"data"].decode())
+                if event != "token":
+                    return
+
+        if response:
+            continue
+
+        # Nothing arrived in time, the job may have ended before its stream was
+        # written (a failed batch) or after the stream expired
+        status = (await fetch_statuses(redis, [job_id]))[0]
+        if status is None:
+            yield format_event("error", "Job not found")
+            return
+        elif status["status"] not in ENDED:
+            # Comment line, keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+        elif status["status"] == "finished":
+            yield format_event("done", f"{status['result']}")
+            return
+        else:
+            yield format_event("error", f"Job {status['status']}")
+            return
@@ -1,4 +1,4 @@
-from openai import OpenAI
+from llm import get_client
 import speech_recognition as sr
 import os
 from dotenv import load_dotenv
@@ -7,10 +7,6 @@ from elevenlabs.play import play
 
 load_dotenv()
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise RuntimeError("GEMINI_API_KEY not set")
-
 eleven_labs_api_key = os.getenv("ELEVENLABS_API_KEY")
 if not eleven_labs_api_key:
     raise RuntimeError("ELEVENLABS_API_KEY not set")
@@ -30,10 +26,7 @@ def speak(text: str):
 def main():
     r = sr.Recognizer()
 
-    client = OpenAI(
-        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        api_key=gemini_api_key,
-    )
+    client = get_client("gemini")
 
     with sr.Microphone() as source:
         r.adjust_for_ambient_noise(source)  # noise cancellation
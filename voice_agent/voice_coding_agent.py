@@ -1,5 +1,5 @@
-from openai.types.chat import ChatCompletionMessageParam
-from openai import OpenAI
+from agents import History, ShellSession, ToolExecutor
+from llm import get_client
 from dotenv import load_dotenv
 import os
 import json
@@ -11,10 +11,6 @@ from elevenlabs.play import play
 
 load_dotenv()
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise RuntimeError("GEMINI_API_KEY not set")
-
 eleven_labs_api_key = os.getenv("ELEVENLABS_API_KEY")
 if not eleven_labs_api_key:
     raise RuntimeError("ELEVENLABS_API_KEY not set")
@@ -31,13 +27,9 @@ def speak(text: str):
     play(audio)
 
 
-def run_command(cmd: str):
-    exit_code = os.system(cmd)
-    print(f"Ran command: {cmd} with exit code {exit_code}")
-    return f"Ran command with exit code {exit_code}"
-
-
-available_tools = {"run_command": run_command}
+# One shell per run, so cd and exported variables carry over between commands
+shell = ShellSession()
+executor = ToolExecutor({"run_command": shell.run})
 
 
 SYSTEM_PROMPT = """
@@ -59,7 +51,7 @@ Output JSON Format:
 { "step": "START" | "PLAN" | "OUTPUT" | "TOOL" | "OBSERVE", "content": "string", "tool": "string", "input": "string" }
 
 Available Tools:
-- run_command(cmd: str)
+- run_command(cmd: str) : Runs a linux cmd in a shell that keeps its working directory and variables between calls. Returns the exit code, stdout and stderr.
 """
 
 
@@ -71,16 +63,11 @@ class ResponseFormat(BaseModel):
     output: Optional[str] = None
 
 
-message_history: list[ChatCompletionMessageParam] = [
-    {"role": "system", "content": SYSTEM_PROMPT},
-]
+history = History(SYSTEM_PROMPT)
 
 r = sr.Recognizer()
 
-client = OpenAI(
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-    api_key=gemini_api_key,
-)
+client = get_client("gemini")
 
 with sr.Microphone() as source:
     r.adjust_for_ambient_noise(source)
@@ -95,7 +82,7 @@ with sr.Microphone() as source:
     print("You said:", stt)
 
 user_query = stt
-message_history.append({"role": "user", "content": user_query})
+history.append({"role": "user", "content": user_query})
 
 VALID_STEPS = {"START", "PLAN", "OUTPUT", "TOOL", "OBSERVE"}
 
@@ -109,7 +96,7 @@ while step_count < max_steps:
 
     response = client.chat.completions.parse(
         model="gemini-2.5-flash",
-        messages=message_history,
+        messages=history.messages(),
         response_format=ResponseFormat,
     )
 
@@ -123,7 +110,7 @@ while step_count < max_steps:
             print("❌ Too many failures. Stopping.")
             break
 
-        message_history.append(
+        history.append(
             {
                 "role": "system",
                 "content": "You FAILED. Output ONE valid JSON step only.",
@@ -138,7 +125,7 @@ while step_count < max_steps:
         print("⚠️ Skipping invalid step:", step_type)
         continue
 
-    message_history.append(
+    history.append(
         {"role": "assistant", "content": json.dumps(parsed_response.model_dump())}
     )
 
@@ -155,10 +142,11 @@ while step_count < max_steps:
         if isinstance(tool_to_call, str) and isinstance(tool_input, str):
             print(f"🛠️: {tool_to_call} {tool_input}")
 
-            tool_response = available_tools[tool_to_call](tool_input)
+            tool_response = executor.run([(tool_to_call, tool_input)])[0]
+            print(tool_response)
 
             # FIX: keep inside normal assistant message flow
-            message_history.append(
+            history.append(
                 {
                     "role": "assistant",
                     "content": json.dumps(
@@ -181,4 +169,3 @@ while step_count < max_steps:
         break  # FIX: instead of exit()
 
 print("⚠️ Max steps reached — stopping.")
-
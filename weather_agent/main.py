@@ -1,29 +1,14 @@
-from openai.types.chat import ChatCompletionMessageParam
+import asyncio
 import requests
-from openai import OpenAI
+from agents import Agent
+from agents.engine import run_cli
 from dotenv import load_dotenv
-import os
-import json
-from pydantic import BaseModel, Field
-from typing import Optional
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set")
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "http://127.0.0.1",
-        "X-Title": "hello-world-test",
-    },
-)
-
 
 def get_weather(city: str):
+    """Current weather conditions and temperature of a city."""
     url = f"https://wttr.in/{city.lower()}?format=%C+%t"
     response = requests.get(url)
 
@@ -33,9 +18,6 @@ def get_weather(city: str):
     return "Something went wrong"
 
 
-available_tools = {"get_weather": get_weather}
-
-
 # Chain of thought prompts are the type of prompts which uses multiple steps to respond to a problem query.
 SYSTEM_PROMPT = """
 You're an expert AI Assistant in resolving user queries using chain of thought.
@@ -91,108 +73,13 @@ OUTPUT: { "step": "OUTPUT", "content": "The current weather for delhi is 20 C wi
 """
 
 
-class ResponseFormat(BaseModel):
-    step: str = Field(
-        ..., description="The id of the step like START, PLAN, OUTPUT, TOOL, OBSERVE"
-    )
-    content: Optional[str] = Field(None, description="The optional string content")
-    tool: Optional[str] = Field(None, description="The id of the tool call")
-    input: Optional[str] = Field(None, description="The input parms for the tool")
-    output: Optional[str] = Field(None, description="The output of the tool call")
-
-
-message_history: list[ChatCompletionMessageParam] = [
-    {"role": "system", "content": SYSTEM_PROMPT},
-]
-
-user_query = input("> ")
-message_history.append({"role": "user", "content": user_query})
-
-VALID_STEPS = {"START", "PLAN", "OUTPUT", "TOOL", "OBSERVE"}
-
-max_steps = 30
-step_count = 0
-retry_limit = 5
-retry_count = 0
-
-while step_count < max_steps:
-    step_count += 1
-
-    response = client.chat.completions.parse(
-        model="openai/gpt-oss-120b:free",
-        messages=message_history,
-        response_format=ResponseFormat,
-    )
-
-    parsed_response = response.choices[0].message.parsed
-
-    if not parsed_response:
-        retry_count += 1
-        print("⚠️ Model returned no JSON — retrying...")
-
-        if retry_count >= retry_limit:
-            print("❌ Too many failures. Stopping.")
-            break
-
-        message_history.append(
-            {
-                "role": "system",
-                "content": "You FAILED. Output ONE valid JSON step only.",
-            }
-        )
-        continue
-
-    retry_count = 0
-
-    try:
-        step_type = parsed_response.step
-
-        if step_type not in VALID_STEPS:
-            print("⚠️ Skipping invalid step:")
-            print(step_type)
-            continue
-
-        message_history.append(
-            {"role": "assistant", "content": json.dumps(parsed_response.model_dump())}
-        )
-
-        if step_type == "START":
-            print(f"🔥 {parsed_response.content}")
-
-        elif step_type == "PLAN":
-            print(f"🧠 {parsed_response.content}")
-
-        elif step_type == "TOOL":
-            tool_to_call = parsed_response.tool
-            tool_input = parsed_response.input
-            if isinstance(tool_to_call, str) and isinstance(tool_input, str):
-                print(f"🛠️: {tool_to_call} {tool_input}")
-
-                tool_response = available_tools[tool_to_call](tool_input)
-
-                message_history.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_to_call,
-                        "content": json.dumps(
-                            {
-                                "step": "OBSERVE",
-                                "tool": tool_to_call,
-                                "input": tool_input,
-                                "output": tool_response,
-                            }
-                        ),
-                    }
-                )
-            else:
-                continue
-
-        elif step_type == "OUTPUT":
-            print(f"🤖 {parsed_response.content}")
-            exit()
-
-    except json.JSONDecodeError:
-        print("⚠️ Skipping malformed JSON:")
-        print(parsed_response)
-
-print("⚠️ Max steps reached — stopping.")
+agent = Agent(
+    SYSTEM_PROMPT,
+    model="openai/gpt-oss-120b:free",
+    tools=lambda session: {"get_weather": get_weather},
+)
+
+
+# python -m weather_agent.main
+if __name__ == "__main__":
+    asyncio.run(run_cli(agent))